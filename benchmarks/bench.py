@@ -0,0 +1,317 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from logging import LoggerAdapter
+from typing import Callable, Optional
+
+from attr import define
+
+import cadquery as cq
+from wisp3d.pegboard import Pegboard, PegboardArrangement, SpoolHolder
+from wisp3d.pegboard.pegboard import Hook
+from wisp3d.utility import Rect, Vec2, wrap_cq_object, set_threadlocal_log_adapter
+
+# Board sizes (width, height) in mm, from a single SKADIS board up to a full wall
+BOARD_SIZES = [(560, 560), (1200, 800), (2000, 1200), (3000, 2000)]
+# Number of spools in a holders row, combinations that don't fit a board are skipped
+SPOOL_COUNTS = [2, 6, 16, 32]
+SPOOL_THICKNESS = 83
+SEPARATOR_WIDTH = 5
+
+
+# Single measured operation
+@define
+class BenchCase:
+    name: str
+    board_size: tuple[int, int]
+    spool_count: Optional[int]
+    # Called before each run (not measured), returns arguments for func
+    setup: Callable[[], tuple]
+    func: Callable[..., object]
+
+    @property
+    def id(self) -> str:
+        size = f"{self.board_size[0]}x{self.board_size[1]}"
+        if self.spool_count is None:
+            return f"{self.name}[{size}]"
+        return f"{self.name}[{size},{self.spool_count}]"
+
+    def run(self, repeat: int) -> "BenchResult":
+        timings = []
+        for _ in range(repeat):
+            args = self.setup()
+            start = time.perf_counter()
+            self.func(*args)
+            timings.append(time.perf_counter() - start)
+        return BenchResult(
+            min=min(timings), median=statistics.median(timings), repeat=repeat
+        )
+
+
+@define
+class BenchResult:
+    min: float
+    median: float
+    repeat: int
+
+
+@define
+class Regression:
+    case_id: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline
+
+
+def make_pegboard(board_size: tuple[int, int]) -> Pegboard:
+    return Pegboard(width=board_size[0], height=board_size[1], thickness=5).add_holes(
+        bottom_hole_center=Vec2(40, 20),
+        interval=Vec2(40, 20),
+        size=Vec2(5, 15),
+        shift_per_row=20,
+    )
+
+
+def fits_board(board_size: tuple[int, int], spool_count: int) -> bool:
+    requested_space = (
+        spool_count * SPOOL_THICKNESS + (spool_count + 1) * SEPARATOR_WIDTH
+    )
+    return requested_space <= board_size[0]
+
+
+def make_arrangement(pegboard: Pegboard, spool_count: int) -> PegboardArrangement:
+    arrangement = PegboardArrangement(pegboard)
+    arrangement.add_holders_row(Hook(), [SPOOL_THICKNESS] * spool_count)
+    return arrangement
+
+
+def xy_workplane():
+    return wrap_cq_object(cq.Workplane("XY"))
+
+
+def export_step(asm, path: str):
+    asm.save(path)
+
+
+def collect_cases(output_dir: str) -> list[BenchCase]:
+    cases = []
+    for board_size in BOARD_SIZES:
+        # Layout cases get a new pegboard in setup, so that they measure
+        # the contact rectangles cache being filled, not only its hits
+        pegboard = make_pegboard(board_size)
+        hook = Hook()
+        # Rect that covers the whole board except of the border
+        probe_rect = Rect(10, 10, board_size[0] - 20, board_size[1] - 20)
+
+        cases += [
+            BenchCase(
+                name="Pegboard.add_holes",
+                board_size=board_size,
+                spool_count=None,
+                setup=lambda bs=board_size: (
+                    Pegboard(width=bs[0], height=bs[1], thickness=5),
+                ),
+                func=lambda p: p.add_holes(
+                    bottom_hole_center=Vec2(40, 20),
+                    interval=Vec2(40, 20),
+                    size=Vec2(5, 15),
+                    shift_per_row=20,
+                ),
+            ),
+            BenchCase(
+                name="Pegboard.expand_rect_x",
+                board_size=board_size,
+                spool_count=None,
+                setup=lambda bs=board_size, h=hook: (make_pegboard(bs), h),
+                func=lambda p, h: p.expand_rect_x(Rect(0, 0, 15, 110), h, 2),
+            ),
+            BenchCase(
+                name="Pegboard.find_holes_that_can_be_attached_to_rect_with_hook",
+                board_size=board_size,
+                spool_count=None,
+                setup=lambda bs=board_size, h=hook: (make_pegboard(bs), h),
+                func=lambda p, h: p.find_holes_that_can_be_attached_to_rect_with_hook(
+                    probe_rect, h
+                ),
+            ),
+            BenchCase(
+                name="Pegboard.make",
+                board_size=board_size,
+                spool_count=None,
+                setup=lambda p=pegboard: (
+                    p,
+                    xy_workplane().transformed(rotate=(90, 0, 0)),
+                ),
+                func=lambda p, wp: p.make(wp),
+            ),
+            BenchCase(
+                name="Pegboard.make(sketch)",
+                board_size=board_size,
+                spool_count=None,
+                setup=lambda p=pegboard: (
+                    p,
+                    xy_workplane().transformed(rotate=(90, 0, 0)),
+                ),
+                func=lambda p, wp: p.make(wp, planar=False),
+            ),
+            BenchCase(
+                name="PlanarProfile.make_face",
+                board_size=board_size,
+                spool_count=None,
+                setup=lambda p=pegboard: (p.planar_profile(), cq.Plane.XZ()),
+                func=lambda profile, plane: profile.make_face(plane),
+            ),
+        ]
+
+        for spool_count in SPOOL_COUNTS:
+            if not fits_board(board_size, spool_count):
+                continue
+
+            arrangement = make_arrangement(pegboard, spool_count)
+            cases += [
+                BenchCase(
+                    name="PegboardArrangement.add_holders_row",
+                    board_size=board_size,
+                    spool_count=spool_count,
+                    setup=lambda bs=board_size: (
+                        PegboardArrangement(make_pegboard(bs)),
+                    ),
+                    func=lambda a, n=spool_count: a.add_holders_row(
+                        Hook(), [SPOOL_THICKNESS] * n
+                    ),
+                ),
+                BenchCase(
+                    name="SpoolHolder.make",
+                    board_size=board_size,
+                    spool_count=spool_count,
+                    setup=lambda a=arrangement: (a.spool_holders, xy_workplane()),
+                    func=lambda holders, wp: [h.make(wp) for h in holders],
+                ),
+                BenchCase(
+                    name="PegboardArrangement.make",
+                    board_size=board_size,
+                    spool_count=spool_count,
+                    setup=lambda a=arrangement: (a, xy_workplane()),
+                    func=lambda a, wp: a.make(wp),
+                ),
+                BenchCase(
+                    name="export_step",
+                    board_size=board_size,
+                    spool_count=spool_count,
+                    setup=lambda a=arrangement: (
+                        a.make(xy_workplane()),
+                        os.path.join(output_dir, "bench.step"),
+                    ),
+                    func=export_step,
+                ),
+            ]
+
+    return cases
+
+
+def compare(
+    results: dict, baseline: dict, threshold: float
+) -> tuple[list[Regression], list[str]]:
+    regressions = []
+    missing = []
+    for case_id, baseline_result in baseline["results"].items():
+        if case_id not in results["results"]:
+            missing.append(case_id)
+            continue
+        current = results["results"][case_id]["min"]
+        if current > baseline_result["min"] * (1 + threshold):
+            regressions.append(
+                Regression(
+                    case_id=case_id, baseline=baseline_result["min"], current=current
+                )
+            )
+    return regressions, missing
+
+
+def collect_meta() -> dict:
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cadquery": getattr(cq, "__version__", "unknown"),
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run wisp3d benchmarks")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", default="benchmarks/baseline.json")
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="store the results as the new baseline instead of comparing",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="allowed relative slowdown against the baseline (0.2 = 20%%)",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "-k", "--filter", default="", help="run only cases whose id contains that text"
+    )
+    args = parser.parse_args(argv)
+
+    # Layout code logs through the thread-local adapter
+    logging.basicConfig(level=logging.WARNING)
+    set_threadlocal_log_adapter(LoggerAdapter(logging.getLogger("bench"), {}))
+
+    results = {"meta": collect_meta(), "results": {}}
+    with tempfile.TemporaryDirectory() as output_dir:
+        for case in collect_cases(output_dir):
+            if args.filter not in case.id:
+                continue
+            result = case.run(args.repeat)
+            results["results"][case.id] = {
+                "min": result.min,
+                "median": result.median,
+                "repeat": result.repeat,
+            }
+            print(f"{case.id:<90} {result.min * 1000:>12.2f} ms", flush=True)
+
+    target = args.baseline if args.save_baseline else args.output
+    with open(target, "wt") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"Results are saved to {target}")
+
+    if args.save_baseline:
+        return 0
+    if not os.path.exists(args.baseline):
+        print(
+            f"No baseline found at {args.baseline}, nothing is compared. "
+            "Save one on this machine with --save-baseline"
+        )
+        return 0
+
+    with open(args.baseline, "rt") as f:
+        baseline = json.load(f)
+    regressions, missing = compare(results, baseline, args.threshold)
+    for case_id in missing:
+        print(f"Not measured (present in baseline): {case_id}")
+    for r in regressions:
+        print(
+            f"REGRESSION {r.case_id}: {r.baseline * 1000:.2f} ms -> "
+            f"{r.current * 1000:.2f} ms (x{r.ratio:.2f})"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,349 @@
+import argparse
+import copy
+import gc
+import json
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import attr
+from attr import define
+
+from wisp3d.pegboard.pegboard_script import PegboardScript
+from wisp3d.script import ScriptInput
+from wisp3d.script.build import build_log
+
+
+def skadis_board(width: int, height: int) -> dict:
+    return {
+        "width": width,
+        "height": height,
+        "thickness": 5,
+        "holes": {
+            "bottom_hole_center": [40, 20],
+            "interval": [40, 20],
+            "size": [5, 15],
+            "shift_per_row": 20,
+        },
+    }
+
+
+def holders_row(spool_count: int, pos: list[int], expand: bool = True) -> dict:
+    return {"spool_thickness": [83] * spool_count, "expand": expand, "pos": pos}
+
+
+# Builds cycle through these configs, 'output' & 'streaming.directory' are set per build
+CONFIGS = [
+    {
+        "pegboard": skadis_board(560, 560),
+        "holders": [holders_row(6, [0, 0])],
+        "workers": 1,
+    },
+    {
+        "pegboard": skadis_board(1200, 800),
+        "holders": [holders_row(12, [0, 0]), holders_row(4, [0, 400], expand=False)],
+        "workers": 1,
+    },
+    {
+        "wall": {
+            "boards": [
+                {**skadis_board(560, 560), "offset": [0, 0]},
+                {**skadis_board(560, 560), "offset": [580, 0]},
+            ]
+        },
+        "holders": [holders_row(10, [0, 0])],
+        "workers": 1,
+    },
+    {
+        "pegboard": skadis_board(560, 560),
+        "holders": [holders_row(5, [0, 0])],
+        "workers": 2,
+        "streaming": {"combined": True},
+    },
+]
+
+
+# Process state after some builds, memory & object counts are taken after gc.collect()
+@define
+class Sample:
+    phase: str
+    builds: int
+    # Index in CONFIGS of the builds since the previous sample, None for idle samples
+    config: Optional[int]
+    # Mean latency of builds since the previous sample, seconds
+    latency: float
+    rss_mb: Optional[float]
+    objects: int
+    fds: Optional[int]
+    threads: int
+    build_handlers: int
+
+
+def rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm", "rt") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Peak RSS is the best that is available: kilobytes on Linux, bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 2**20 if sys.platform == "darwin" else maxrss / 2**10
+
+
+def open_fds() -> Optional[int]:
+    for fd_dir in ["/proc/self/fd", "/dev/fd"]:
+        try:
+            return len(os.listdir(fd_dir))
+        except OSError:
+            continue
+    return None
+
+
+def take_sample(
+    phase: str, builds: int, config: Optional[int], latencies: list[float]
+) -> Sample:
+    gc.collect()
+    return Sample(
+        phase=phase,
+        builds=builds,
+        config=config,
+        latency=statistics.mean(latencies) if latencies else 0.0,
+        rss_mb=rss_mb(),
+        objects=len(gc.get_objects()),
+        fds=open_fds(),
+        threads=threading.active_count(),
+        build_handlers=len(build_log.logger.handlers),
+    )
+
+
+class Soak:
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.script = PegboardScript()
+        self.samples: list[Sample] = []
+        self.builds = 0
+        self._started = 0
+        self._lock = threading.Lock()
+
+    # Runs a single build of CONFIGS[config] with its own output paths
+    # & removes its files, returns the latency
+    def run_build(self, config: int) -> float:
+        with self._lock:
+            self._started += 1
+            build_dir = os.path.join(self.output_dir, str(self._started))
+        os.makedirs(build_dir)
+        root = copy.deepcopy(CONFIGS[config])
+        root["output"] = os.path.join(build_dir, "pegboard.step")
+        if "streaming" in root:
+            root["streaming"]["directory"] = os.path.join(build_dir, "parts")
+
+        start = time.perf_counter()
+        self.script.create_build(ScriptInput(root)).resolve_all()
+        latency = time.perf_counter() - start
+
+        shutil.rmtree(build_dir)
+        with self._lock:
+            self.builds += 1
+        return latency
+
+    # Builds cycle through CONFIGS, a sample is taken after every build
+    def run_sequential(self, n_builds: int, phase: str = "sequential"):
+        for i in range(n_builds):
+            config = i % len(CONFIGS)
+            latency = self.run_build(config)
+            self.samples.append(take_sample(phase, self.builds, config, [latency]))
+
+    # Builds run in batches of n_threads, all builds of a batch use the same config
+    # & a sample is taken after every batch
+    def run_concurrent(self, n_builds: int, n_threads: int):
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            done = 0
+            while done < n_builds:
+                config = (done // n_threads) % len(CONFIGS)
+                batch_size = min(n_threads, n_builds - done)
+                latencies = list(executor.map(self.run_build, [config] * batch_size))
+                done += len(latencies)
+                self.samples.append(
+                    take_sample("concurrent", self.builds, config, latencies)
+                )
+
+
+@define
+class Thresholds:
+    rss_mb: float
+    objects: int
+    fds: int
+    # RSS growth between the idle samples before & after all measured builds
+    idle_rss_mb: float
+    latency_ratio: float
+    # Number of samples of a config whose median is compared at the start & at the end
+    window: int
+
+
+def median_of(samples: list[Sample], name: str) -> Optional[float]:
+    values = [getattr(s, name) for s in samples if getattr(s, name) is not None]
+    return statistics.median(values) if values else None
+
+
+# Configs differ a lot in latency & memory, so samples are grouped by config
+# and the first & the last windows of every group are compared.
+# Returns descriptions of failures.
+def check_growth(samples: list[Sample], t: Thresholds) -> list[str]:
+    failures = []
+    for config in sorted({s.config for s in samples}):
+        group = [s for s in samples if s.config == config]
+        failures += [f"config {config}: {f}" for f in check_group_growth(group, t)]
+    return failures
+
+
+def check_group_growth(samples: list[Sample], t: Thresholds) -> list[str]:
+    failures = []
+    window = max(1, min(t.window, len(samples) // 2))
+    first, last = samples[:window], samples[-window:]
+
+    for name, limit in [("rss_mb", t.rss_mb), ("objects", t.objects)]:
+        start, end = median_of(first, name), median_of(last, name)
+        if start is not None and end - start > limit:
+            failures.append(f"{name} grew from {start:g} to {end:g} (limit +{limit:g})")
+
+    start, end = median_of(first, "latency"), median_of(last, "latency")
+    if start and end / start > t.latency_ratio:
+        failures.append(
+            f"latency grew from {start * 1000:.1f} ms to {end * 1000:.1f} ms "
+            f"(limit x{t.latency_ratio:g})"
+        )
+    return failures
+
+
+# Nothing may be left behind when no build is running
+def check_idle(idle_before: Sample, idle_after: Sample, t: Thresholds) -> list[str]:
+    failures = []
+    if (
+        idle_before.rss_mb is not None
+        and idle_after.rss_mb - idle_before.rss_mb > t.idle_rss_mb
+    ):
+        failures.append(
+            f"rss_mb: {idle_before.rss_mb:.1f} -> {idle_after.rss_mb:.1f} "
+            f"(limit +{t.idle_rss_mb:g})"
+        )
+    if idle_before.fds is not None and idle_after.fds - idle_before.fds > t.fds:
+        failures.append(
+            f"open file descriptors: {idle_before.fds} -> {idle_after.fds} "
+            f"(limit +{t.fds})"
+        )
+    if idle_after.build_handlers != idle_before.build_handlers:
+        failures.append(
+            f'handlers of the "build" logger: {idle_before.build_handlers} '
+            f"-> {idle_after.build_handlers}"
+        )
+    if idle_after.threads != idle_before.threads:
+        failures.append(f"threads: {idle_before.threads} -> {idle_after.threads}")
+    return failures
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Run many builds in one process & check for leaks and slowdowns"
+    )
+    parser.add_argument("--builds", type=int, default=200, help="sequential builds")
+    parser.add_argument(
+        "--concurrent-builds",
+        type=int,
+        default=200,
+        help="builds that run in parallel threads",
+    )
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument(
+        "--warmup",
+        type=int,
+        default=2 * len(CONFIGS),
+        help="builds that are not measured, caches & imports settle during them",
+    )
+    parser.add_argument("--max-rss-growth", type=float, default=50, help="MiB")
+    parser.add_argument(
+        "--max-idle-rss-growth",
+        type=float,
+        default=100,
+        help="MiB, between the idle states before & after the measured builds",
+    )
+    parser.add_argument("--max-objects-growth", type=int, default=5000)
+    parser.add_argument("--max-fds-growth", type=int, default=0)
+    parser.add_argument("--max-latency-ratio", type=float, default=1.5)
+    parser.add_argument(
+        "--window", type=int, default=10, help="samples of a config at each end"
+    )
+    parser.add_argument("--output", default="soak_results.json")
+    parser.add_argument(
+        "--verbose", action="store_true", help="print build logs to stderr"
+    )
+    args = parser.parse_args(argv)
+
+    build_log.set_output_handler(
+        logging.StreamHandler() if args.verbose else logging.NullHandler()
+    )
+    thresholds = Thresholds(
+        rss_mb=args.max_rss_growth,
+        objects=args.max_objects_growth,
+        fds=args.max_fds_growth,
+        idle_rss_mb=args.max_idle_rss_growth,
+        latency_ratio=args.max_latency_ratio,
+        window=args.window,
+    )
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        soak = Soak(output_dir)
+        soak.run_sequential(args.warmup, phase="warmup")
+        idle_before = take_sample("idle", soak.builds, None, [])
+
+        soak.run_sequential(args.builds)
+        sequential = [s for s in soak.samples if s.phase == "sequential"]
+        print(f"{len(sequential)} sequential builds", flush=True)
+
+        soak.run_concurrent(args.concurrent_builds, args.threads)
+        concurrent = [s for s in soak.samples if s.phase == "concurrent"]
+        print(f"{args.concurrent_builds} concurrent builds", flush=True)
+        idle_after = take_sample("idle", soak.builds, None, [])
+
+    # Concurrent builds have another latency & memory profile, phases are checked apart
+    failures = check_idle(idle_before, idle_after, thresholds)
+    for phase, samples in [("sequential", sequential), ("concurrent", concurrent)]:
+        if samples:
+            failures += [f"{phase}: {f}" for f in check_growth(samples, thresholds)]
+
+    with open(args.output, "wt") as f:
+        json.dump(
+            {
+                "samples": [attr.asdict(s) for s in soak.samples],
+                "idle": [attr.asdict(idle_before), attr.asdict(idle_after)],
+                "failures": failures,
+            },
+            f,
+            indent=2,
+        )
+    print(f"Results are saved to {args.output}")
+
+    for s in [idle_before, idle_after]:
+        print(
+            f"after {s.builds} builds: rss {s.rss_mb or 0:.1f} MiB, "
+            f"{s.objects} objects, {s.fds} fds, {s.threads} threads, "
+            f"{s.build_handlers} build handlers"
+        )
+    for failure in failures:
+        print(f"FAILURE {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import argparse
+import glob
+import json
+import os
+import sys
+
+import attr
+import cattr
+
+from wisp3d.pegboard.pegboard_arrangement import xy_workplane
+from wisp3d.pegboard.pegboard_script import PegboardScript
+from wisp3d.script import ScriptInput
+from wisp3d.utility import atomic_output
+from wisp3d.utility.fingerprint import (
+    Fingerprint,
+    FingerprintTolerances,
+    fingerprint,
+    compare_fingerprints,
+)
+
+# Corpus layout: <corpus>/configs/<name>.yml & <corpus>/golden/<name>.json
+default_corpus = "fingerprints"
+
+
+def make_fingerprints(
+    config_path: str, tolerances: FingerprintTolerances
+) -> dict[str, Fingerprint]:
+    config = PegboardScript.parse_input(ScriptInput.from_file(config_path))
+    arrangement = PegboardScript.make_arrangement(config, None)
+    # Parts are made in this process one by one, the same way for every run
+    return {
+        name: fingerprint(part, tolerances=tolerances)
+        for name, part, _ in arrangement.iter_parts(xy_workplane())
+    }
+
+
+def golden_path(corpus: str, config_path: str) -> str:
+    name = os.path.splitext(os.path.basename(config_path))[0]
+    return os.path.join(corpus, "golden", f"{name}.json")
+
+
+def update(corpus: str, config_path: str, tolerances: FingerprintTolerances):
+    fingerprints = make_fingerprints(config_path, tolerances)
+    path = golden_path(corpus, config_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_output(path) as tmp_path:
+        with open(tmp_path, "wt") as f:
+            json.dump(
+                {name: attr.asdict(fp) for name, fp in fingerprints.items()},
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+    print(f"{config_path}: {len(fingerprints)} golden fingerprints are written")
+
+
+def check(corpus: str, config_path: str, tolerances: FingerprintTolerances) -> bool:
+    path = golden_path(corpus, config_path)
+    if not os.path.exists(path):
+        print(f"{config_path}: no golden fingerprints, run update")
+        return False
+    with open(path, "rt") as f:
+        golden = {
+            name: cattr.structure(data, Fingerprint)
+            for name, data in json.load(f).items()
+        }
+
+    actual = make_fingerprints(config_path, tolerances)
+    ok = True
+    for name in sorted(golden.keys() | actual.keys()):
+        if name not in actual:
+            print(f"{config_path}: {name}: part is missing")
+            ok = False
+        elif name not in golden:
+            print(f"{config_path}: {name}: unexpected part")
+            ok = False
+        else:
+            for difference in compare_fingerprints(
+                golden[name], actual[name], tolerances
+            ):
+                print(f"{config_path}: {name}: {difference}")
+                ok = False
+    if ok:
+        print(f"{config_path}: {len(actual)} parts match")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check made parts against golden fingerprints"
+    )
+    parser.add_argument("command", choices=["check", "update"])
+    parser.add_argument("configs", nargs="*", help="configs of the corpus by default")
+    parser.add_argument("--corpus", default=default_corpus)
+    parser.add_argument("--rel-tol", type=float, default=FingerprintTolerances().rel)
+    parser.add_argument("--abs-tol", type=float, default=FingerprintTolerances().abs)
+    args = parser.parse_args()
+
+    configs = args.configs or sorted(
+        glob.glob(os.path.join(args.corpus, "configs", "*.yml"))
+    )
+    tolerances = FingerprintTolerances(rel=args.rel_tol, abs=args.abs_tol)
+    if args.command == "update":
+        for config_path in configs:
+            update(args.corpus, config_path, tolerances)
+    else:
+        results = [check(args.corpus, c, tolerances) for c in configs]
+        sys.exit(0 if all(results) else 1)
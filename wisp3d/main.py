@@ -1,9 +1,22 @@
-from wisp3d.pegboard.pegboard_script import PegboardScript
-from wisp3d.script import ScriptInput
+import argparse
+
+from wisp3d.script import ScriptInput, ScriptInputError, default_registry
+from wisp3d.script.build import build_log
+from wisp3d.utility import color_stream_handler
 
 if __name__ == "__main__":
-    with open("config.yml", "rt") as f:
-        script_input = ScriptInput.from_yaml(f.read())
+    parser = argparse.ArgumentParser(description="Build a model from a config")
+    parser.add_argument("config", nargs="?", default="config.yml")
+    parser.add_argument("--script", default="pegboard")
+    args = parser.parse_args()
+
+    # Print colored text instead of JSON records
+    build_log.set_output_handler(color_stream_handler())
+
+    script_input = ScriptInput.from_file(args.config)
 
-    build = PegboardScript().create_build(script_input)
+    try:
+        build = default_registry().create(args.script).create_build(script_input)
+    except ScriptInputError as e:
+        parser.exit(1, f"{args.config}: {e}\n")
     build.resolve_all()
@@ -1,3 +1,4 @@
 from .pegboard import Pegboard
 from .spoolholder import SpoolHolder
+from .wall import PegboardWall, WallBoard
 from .pegboard_arrangement import PegboardArrangement
@@ -0,0 +1,76 @@
+from wisp3d.utility import Rect
+from .pegboard_arrangement import PegboardArrangement
+
+
+def svg_rect(rect: Rect, height: float, style: str, r: float = 0) -> str:
+    # SVG Y axis is directed down
+    return (
+        f'<rect x="{float(rect.min_x):g}" y="{height - float(rect.max_y):g}" '
+        f'width="{float(rect.width):g}" height="{float(rect.height):g}" '
+        f'rx="{r:g}" style="{style}"/>'
+    )
+
+
+# Front view of the arrangement: boards, holes, holders & separators.
+# It is drawn from the layout only, so it doesn't need any geometry to be made.
+def make_layout_svg(arrangement: PegboardArrangement, margin: float = 10) -> str:
+    pegboard = arrangement.pegboard
+    width = float(pegboard.width)
+    height = float(pegboard.height)
+
+    elements = []
+    for board in arrangement.boards:
+        elements.append(
+            svg_rect(
+                Rect(
+                    board.offset.x,
+                    board.offset.y,
+                    board.pegboard.width,
+                    board.pegboard.height,
+                ),
+                height,
+                "fill:#f4f4f4;stroke:#999999;stroke-width:1",
+            )
+        )
+    for hole in pegboard.holes:
+        elements.append(
+            svg_rect(
+                Rect(
+                    hole.center_x - hole.width / 2,
+                    hole.center_y - hole.height / 2,
+                    hole.width,
+                    hole.height,
+                ),
+                height,
+                "fill:#333333" if not hole.closed else "fill:#bbbbbb",
+                r=float(hole.width) / 2,
+            )
+        )
+    for holder in arrangement.spool_holders:
+        elements.append(
+            svg_rect(
+                holder.rect, height, "fill:#2e9e44;fill-opacity:0.6;stroke:#1b6b2c"
+            )
+        )
+        elements.append(
+            svg_rect(
+                Rect(
+                    holder.rect.min_x + holder.separator_pos,
+                    holder.rect.min_y,
+                    holder.separator_thickness,
+                    holder.rect.height,
+                ),
+                height,
+                "fill:#2f5fd0",
+            )
+        )
+
+    return "\n".join(
+        [
+            '<svg xmlns="http://www.w3.org/2000/svg" '
+            f'viewBox="{-margin:g} {-margin:g} {width + 2 * margin:g} {height + 2 * margin:g}" '
+            f'width="{width + 2 * margin:g}mm" height="{height + 2 * margin:g}mm">',
+            *elements,
+            "</svg>",
+        ]
+    )
@@ -1,10 +1,29 @@
+import hashlib
+import time
 from itertools import groupby
-from typing import List, Literal
+from typing import List, Literal, Tuple
 
 import attr
 from attr import define, field
 import cattr
-from wisp3d.utility import ExactCqWrapper, to_exact_single, Vec2, Rect, AnyNum, ExactNum
+from cattr.gen import make_dict_structure_fn
+import cadquery as cq
+from wisp3d.utility import (
+    ExactCqWrapper,
+    to_exact_single,
+    to_float,
+    Vec2,
+    Rect,
+    AnyNum,
+    ExactNum,
+    log,
+)
+from wisp3d.utility.planar import PlanarProfile, Slot
+
+# Has to be increased whenever Pegboard.make changes the geometry it produces.
+# 2: the face is built from exact outlines, the solid is the same
+# but its B-rep is built differently, so stored meshes may differ
+geometry_version = 2
 
 
 # Slot-shaped hole like holes on the IKEA SKADIS pegboards
@@ -44,8 +63,8 @@ class Hole:
         return wp
 
 
-# Hook that is used to fix something to a pegboard
-@define
+# Hook that is used to fix something to a pegboard, immutable so that it can be a cache key
+@define(frozen=True)
 class Hook:
     length_z = field(converter=to_exact_single, default=12)
     width = field(converter=to_exact_single, default=4.5)
@@ -85,39 +104,59 @@ class Hook:
         return wp + box1 + box2
 
 
+# Config of holes lattice
+@define
+class HolesStructuredData:
+    bottom_hole_center: Vec2
+    interval: Vec2
+    size: Vec2
+    shift_per_row: ExactNum
+
+
+# Config of a pegboard
+@define
+class PegboardStructuredData:
+    width: ExactNum
+    height: ExactNum
+    thickness: ExactNum
+    holes: HolesStructuredData
+
+    def make_pegboard(self) -> "Pegboard":
+        return Pegboard(
+            width=self.width, height=self.height, thickness=self.thickness
+        ).add_holes(
+            bottom_hole_center=self.holes.bottom_hole_center,
+            interval=self.holes.interval,
+            size=self.holes.size,
+            shift_per_row=self.holes.shift_per_row,
+        )
+
+
 @define
 class Pegboard:
     width: ExactNum = field(converter=to_exact_single)
     height: ExactNum = field(converter=to_exact_single)
     thickness: ExactNum = field(converter=to_exact_single)
     holes: ExactNum = field(factory=list)
+    # Hook -> contact rectangles of all holes, see contact_rectangles
+    _contact_rects: dict = field(init=False, factory=dict, eq=False, repr=False)
 
     @staticmethod
     def deserialize(data):
-        # Unstructure basic pegboard fields
-        data_copy = dict(data)
-        del data_copy["holes"]
-        pegboard = cattr.structure(data_copy, Pegboard)
-
-        # Unstructure holes data
-        @define
-        class HolesStructuredData:
-            bottom_hole_center: Vec2
-            interval: Vec2
-            size: Vec2
-            shift_per_row: ExactNum
-
-        holes_data = data["holes"]
-        hd: HolesStructuredData = cattr.structure(holes_data, HolesStructuredData)
-
-        pegboard.add_holes(
-            bottom_hole_center=hd.bottom_hole_center,
-            interval=hd.interval,
-            size=hd.size,
-            shift_per_row=hd.shift_per_row,
-        )
+        return cattr.structure(data, PegboardStructuredData).make_pegboard()
+
+    # The cache is not pickled, so that parts sent to worker processes stay small
+    def __getstate__(self):
+        return {
+            a.name: getattr(self, a.name)
+            for a in attr.fields(Pegboard)
+            if a.name != "_contact_rects"
+        }
 
-        return pegboard
+    def __setstate__(self, state):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, "_contact_rects", {})
 
     def add_holes(
         self,
@@ -126,7 +165,10 @@ class Pegboard:
         size: Vec2,
         shift_per_row: AnyNum,
     ) -> "Pegboard":
+        if interval.x <= 0 or interval.y <= 0:
+            raise ValueError("Interval between holes must be positive")
         shift_per_row = to_exact_single(shift_per_row)
+        pegboard_rect = Rect(0, 0, self.width, self.height)
 
         y = bottom_hole_center.y
         row_shift = 0
@@ -135,25 +177,66 @@ class Pegboard:
             x = row_start_x
             while x < self.width:
                 hole = Hole(x, y, size.x, size.y)
-                if hole.is_inside_rect(Rect(0, 0, self.width, self.height)):
+                if hole.is_inside_rect(pegboard_rect):
                     self.holes.append(hole)
                 x += interval.x
             y += interval.y
             row_shift += shift_per_row
 
+        self._contact_rects.clear()
         return self
 
-    def make(self, wp):
-        # Create a sketch
-        s = wp.sketch()
-        # Create pegboard rectangle
-        s.push([(self.width / 2, self.height / 2)]).rect(
-            self.width, self.height
-        ).reset()
-        # Cut holes
-        Hole.make_on_sketch(s, self.holes, mode="s")
-        # Extrude the sketch
-        wp = s.finalize().extrude(-self.thickness)
+    # Hash of everything that defines the made geometry, computed without making it
+    def geometry_key(self) -> str:
+        return hashlib.sha256(
+            repr(
+                (geometry_version, self.width, self.height, self.thickness, self.holes)
+            ).encode()
+        ).hexdigest()
+
+    # Outline of the pegboard with all holes, in exact numbers
+    def planar_profile(self) -> PlanarProfile:
+        return PlanarProfile(
+            Rect(0, 0, self.width, self.height),
+            [Slot(h.center_x, h.center_y, h.width, h.height) for h in self.holes],
+        )
+
+    # With planar=True the face with holes is built directly from exact outlines,
+    # otherwise holes are cut from the rectangle by a sketch.
+    # Both produce the same solid, the sketch is also used if holes overlap.
+    def make(self, wp, planar: bool = True):
+        start = time.perf_counter()
+        profile = self.planar_profile() if planar else None
+        if profile is not None:
+            try:
+                profile.validate()
+            except ValueError as e:
+                log().warning("Pegboard holes are cut by a sketch: %s", e)
+                profile = None
+
+        if profile is not None:
+            face = profile.make_face(wp.plane)
+            solid = cq.Solid.extrudeLinear(
+                face, wp.plane.zDir * -to_float(self.thickness)
+            )
+            wp = wp.newObject([solid])
+        else:
+            # Create a sketch
+            s = wp.sketch()
+            # Create pegboard rectangle
+            s.push([(self.width / 2, self.height / 2)]).rect(
+                self.width, self.height
+            ).reset()
+            # Cut holes
+            Hole.make_on_sketch(s, self.holes, mode="s")
+            # Extrude the sketch
+            wp = s.finalize().extrude(-self.thickness)
+        log().debug(
+            "Pegboard with %d holes is extruded from a %s in %.3f s",
+            len(self.holes),
+            "planar face" if profile is not None else "sketch",
+            time.perf_counter() - start,
+        )
         # Add discs that close the hole
         for hole in self.holes:
             if hole.closed:
@@ -167,10 +250,19 @@ class Pegboard:
                 )
         return wp
 
+    # Contact rectangles of all holes for a hook.
+    # They are computed once per hook and shared by all holders on the pegboard.
+    def contact_rectangles(self, hook: Hook) -> List[Tuple[Hole, Rect]]:
+        rects = self._contact_rects.get(hook)
+        if rects is None:
+            rects = [(h, hook.contact_rectangle(h)) for h in self.holes]
+            self._contact_rects[hook] = rects
+        return rects
+
     def find_holes_that_can_be_attached_to_rect_with_hook(
         self, rect: Rect, hook: Hook
     ) -> List[Hole]:
-        return [h for h in self.holes if hook.contact_rectangle(h).is_inside_of(rect)]
+        return [h for h, c in self.contact_rectangles(hook) if c.is_inside_of(rect)]
 
     # Expands rect so that it covers at least required_n_columns hole columns
     def expand_rect_x(
@@ -180,13 +272,11 @@ class Pegboard:
         required_n_columns: int,
         expand_dir: Literal["both", "left", "right"] = "both",
     ) -> Rect:
+        contact_rects = self.contact_rectangles(hook)
+
         def number_of_columns(holder_rect: Rect):
             return len(
-                set(
-                    h.center_x
-                    for h in self.holes
-                    if hook.contact_rectangle(h).is_inside_of(holder_rect)
-                )
+                set(h.center_x for h, c in contact_rects if c.is_inside_of(holder_rect))
             )
 
         def candidate_score(holder_rect: Rect, expansion_candidate: Rect):
@@ -201,8 +291,7 @@ class Pegboard:
         # Find & sort holes to expand to
         expansion_candidates = list(
             c
-            for h in self.holes
-            for c in [hook.contact_rectangle(h)]
+            for _, c in contact_rects
             if candidate_score(rect, c) != 0
             and (
                 (expansion_dir_has_left and c.min_x < rect.min_x)
@@ -217,3 +306,13 @@ class Pegboard:
             rect = rect.expand_x(c.min_x).expand_x(c.max_x)
 
         return rect
+
+
+# Structuring functions are generated once at import instead of on the first deserialization
+for _cls in [HolesStructuredData, PegboardStructuredData]:
+    cattr.register_structure_hook(
+        _cls,
+        make_dict_structure_fn(
+            _cls, cattr.global_converter, _cattrs_forbid_extra_keys=True
+        ),
+    )
@@ -1,17 +1,55 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator, Optional
+
 import cadquery as cq
 from .pegboard import Pegboard, Hook
 from .spoolholder import SpoolHolder
-from wisp3d.utility import Rect, Vec2, AnyNum, to_exact_list, wrap_cq_object, log
+from .wall import PegboardWall, WallBoard
+from wisp3d.utility import (
+    Rect,
+    Vec2,
+    AnyNum,
+    to_exact_list,
+    wrap_cq_object,
+    log,
+    worker_logging,
+    ExactCqWrapper,
+    shape_to_brep,
+    shape_from_brep,
+)
+
+
+def xy_workplane():
+    return wrap_cq_object(cq.Workplane("XY"))
+
+
+# Tasks that are run in worker processes, shapes are returned as BREP
+def make_board_brep(board: WallBoard) -> bytes:
+    return shape_to_brep(board.make(xy_workplane().transformed(rotate=(90, 0, 0))))
+
+
+def make_holder_breps(holder: SpoolHolder) -> tuple[bytes, bytes]:
+    made_holder, made_separator = holder.make(xy_workplane())
+    return shape_to_brep(made_holder), shape_to_brep(made_separator)
 
 
 class PegboardArrangement:
+    # Pegboard used to arrange holders, for a wall it covers all boards
     pegboard: Pegboard
+    # Boards that are actually made
+    boards: list[WallBoard]
     spool_holders: list[SpoolHolder]
 
-    def __init__(self, pegboard: Pegboard):
+    def __init__(self, pegboard: Pegboard, boards: Optional[list[WallBoard]] = None):
         self.pegboard = pegboard
+        self.boards = boards if boards is not None else [WallBoard(pegboard)]
         self.spool_holders = []
 
+    @staticmethod
+    def from_wall(wall: PegboardWall) -> "PegboardArrangement":
+        return PegboardArrangement(wall.layout_pegboard(), wall.boards)
+
     def add_holders_row(
         self,
         hook: Hook,
@@ -110,19 +148,64 @@ class PegboardArrangement:
             # Set last_spool_start_x to be used in the next iteration
             last_spool_start_x = spool_end_x + separator_width
 
-    def make(self, xy_wp):
-        pegboard_wp = xy_wp.transformed(rotate=(90, 0, 0))
-        pegboard_wp = self.pegboard.make(pegboard_wp)
-        asm = wrap_cq_object(cq.Assembly())
+    def board_name(self, index: int) -> str:
+        return "Pegboard" if len(self.boards) == 1 else f"Pegboard {index}"
 
-        asm.add(pegboard_wp, color=cq.Color("white"), name="Pegboard")
+    # Parts one by one: (name, made part, color).
+    # The arrangement doesn't keep references to yielded parts.
+    def iter_parts(self, xy_wp) -> Iterator[tuple[str, ExactCqWrapper, cq.Color]]:
+        pegboard_wp = xy_wp.transformed(rotate=(90, 0, 0))
+        for i, board in enumerate(self.boards):
+            yield self.board_name(i), board.make(pegboard_wp), cq.Color("white")
 
         for i, holder in enumerate(self.spool_holders):
             made_holder, made_separator = holder.make(xy_wp)
-            name = f"H{i}"
-            asm = asm.add(made_holder, color=cq.Color("green"), name=f"{name} - Holder")
-            asm = asm.add(
-                made_separator, color=cq.Color("blue"), name=f"{name} - Separator"
-            )
+            yield f"H{i} - Holder", made_holder, cq.Color("green")
+            yield f"H{i} - Separator", made_separator, cq.Color("blue")
+
+    # Same as iter_parts, but every board & every holder is made in a separate process.
+    # If not ordered, parts are yielded as soon as they are made.
+    def iter_parts_parallel(
+        self, max_workers: Optional[int] = None, ordered: bool = True
+    ) -> Iterator[tuple[str, cq.Shape, cq.Color]]:
+        with worker_logging() as pool_logging, ProcessPoolExecutor(
+            max_workers=max_workers, **pool_logging
+        ) as executor:
+            # Future -> names & colors of parts it makes
+            futures = {}
+            for i, board in enumerate(self.boards):
+                future = executor.submit(make_board_brep, board)
+                futures[future] = [(self.board_name(i), cq.Color("white"))]
+            for i, holder in enumerate(self.spool_holders):
+                future = executor.submit(make_holder_breps, holder)
+                futures[future] = [
+                    (f"H{i} - Holder", cq.Color("green")),
+                    (f"H{i} - Separator", cq.Color("blue")),
+                ]
+
+            # Futures are dropped once their parts are yielded, so BREP data is released
+            if ordered:
+                queue = deque(futures)
+                done = (queue.popleft() for _ in range(len(queue)))
+            else:
+                done = as_completed(futures)
+            for future in done:
+                parts = futures.pop(future)
+                breps = future.result()
+                if isinstance(breps, bytes):
+                    breps = [breps]
+                for (name, color), brep in zip(parts, breps):
+                    yield name, shape_from_brep(brep), color
 
+    def make(self, xy_wp):
+        asm = wrap_cq_object(cq.Assembly())
+        for name, part, color in self.iter_parts(xy_wp):
+            asm = asm.add(part, color=color, name=name)
+        return asm
+
+    # Same as make, but every board & every holder is made in a separate process
+    def make_parallel(self, max_workers: Optional[int] = None):
+        asm = wrap_cq_object(cq.Assembly())
+        for name, part, color in self.iter_parts_parallel(max_workers):
+            asm = asm.add(part, color=color, name=name)
         return asm
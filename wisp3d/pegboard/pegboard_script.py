@@ -1,50 +1,257 @@
+import contextlib
+import os
+from typing import Optional
+
 import cadquery as cq
 import cattr
+import cattrs
 from attr import define
+from cattr.gen import make_dict_structure_fn
 
-from wisp3d.pegboard import PegboardArrangement, Pegboard
-from wisp3d.pegboard.pegboard import Hook
+from wisp3d.pegboard import PegboardArrangement
+from wisp3d.pegboard.pegboard_arrangement import (
+    xy_workplane,
+    make_board_brep,
+    make_holder_breps,
+)
+from wisp3d.pegboard.layout_svg import make_layout_svg
+from wisp3d.pegboard.pegboard import Hook, PegboardStructuredData
+from wisp3d.pegboard.wall import WallStructuredData
 from wisp3d.script import Script, Build, ExportTarget
 from wisp3d.script.export_target import BuildContext
-from wisp3d.script.script import ScriptInput
-from wisp3d.utility import ExactCqWrapper, Vec2, wrap_cq_object, log, ExactNum
+from wisp3d.script.script import ScriptInput, ScriptInputError
+from wisp3d.utility import (
+    ExactCqWrapper,
+    Vec2,
+    wrap_cq_object,
+    unwrap_cq_object,
+    log,
+    ExactNum,
+    atomic_output,
+    SvgCache,
+    PreviewExporter,
+    MeshStore,
+    tessellate,
+    write_binary_stl,
+)
+
+
+@define
+class HolderRowStructure:
+    spool_thickness: list[ExactNum]
+    expand: bool
+    pos: Vec2
+
+
+@define
+class PreviewsStructure:
+    # Where part & layout previews are written
+    directory: str = "previews"
+    # Where rendered previews are cached by a geometry hash
+    cache: str = ".wisp3d_cache/svg"
+
+
+@define
+class MeshesStructure:
+    # Where .stl files of parts are written
+    directory: str = "meshes"
+    # Where tessellated parts are stored by a geometry key
+    store: str = ".wisp3d_cache/meshes"
+    tolerance: float = 0.1
+    angular_tolerance: float = 0.1
+
+
+@define
+class StreamingStructure:
+    # Where every part is exported to its own .step file
+    directory: str = "parts"
+    # Whether to export the combined assembly to 'output' after all parts
+    combined: bool = False
+
+
+# Schema of the script input
+@define
+class PegboardScriptConfig:
+    holders: list[HolderRowStructure]
+    pegboard: Optional[PegboardStructuredData] = None
+    wall: Optional[WallStructuredData] = None
+    workers: Optional[int] = None
+    output: str = "pegboard.step"
+    previews: Optional[PreviewsStructure] = None
+    meshes: Optional[MeshesStructure] = None
+    # Export parts as soon as they are made instead of making the whole assembly first
+    streaming: Optional[StreamingStructure] = None
+
+
+# cattrs turns any value into a bool, only real booleans are accepted
+def structure_strict_bool(data, cl) -> bool:
+    if not isinstance(data, bool):
+        raise ValueError(f"{data!r} is not a boolean")
+    return data
+
+
+# Registered before the hooks below are generated, they look up field hooks once
+cattr.register_structure_hook(bool, structure_strict_bool)
+
+for _cls in [
+    HolderRowStructure,
+    PreviewsStructure,
+    MeshesStructure,
+    StreamingStructure,
+    PegboardScriptConfig,
+]:
+    cattr.register_structure_hook(
+        _cls,
+        make_dict_structure_fn(
+            _cls, cattr.global_converter, _cattrs_forbid_extra_keys=True
+        ),
+    )
 
 
 class PegboardScript(Script):
     def create_build(self, input_data: ScriptInput) -> Build:
+        # Validate the whole input before any target is resolved
+        config = PegboardScript.parse_input(input_data)
+
         prepare_target = ExportTarget(
             name="Prepare",
-            resolve_func=lambda b: PegboardScript.make_arrangement(input_data, b),
+            resolve_func=lambda b: PegboardScript.make_arrangement(config, b),
+            input_keys=["pegboard", "wall", "holders"],
         )
         make_assemble_target = ExportTarget(
             name="Make",
-            resolve_func=PegboardScript.make_assembly,
+            resolve_func=lambda b, a: PegboardScript.make_assembly(
+                b, a, config.workers
+            ),
             dependencies=[prepare_target],
+            input_keys=["workers"],
         )
         export_to_step_target = ExportTarget(
             name="Export to .step",
-            resolve_func=PegboardScript.export_to_step,
+            resolve_func=lambda b, a: PegboardScript.export_to_step(
+                b, a, config.output
+            ),
             dependencies=[make_assemble_target],
+            input_keys=["output"],
         )
-        return Build().add_target(export_to_step_target)
+        build = Build()
+
+        if config.streaming is None:
+            build.add_target(export_to_step_target)
+        else:
+            build.add_target(
+                ExportTarget(
+                    name="Export parts",
+                    resolve_func=lambda b, a: PegboardScript.export_parts_streaming(
+                        b,
+                        a,
+                        config.streaming,
+                        config.output,
+                        config.workers,
+                        config.previews,
+                    ),
+                    dependencies=[prepare_target],
+                    input_keys=["streaming", "output", "workers", "previews"],
+                )
+            )
+
+        if config.previews is not None:
+            build.add_target(
+                ExportTarget(
+                    name="Export layout preview",
+                    resolve_func=lambda b, a: PegboardScript.export_layout_preview(
+                        b, a, config.previews
+                    ),
+                    dependencies=[prepare_target],
+                    input_keys=["previews"],
+                )
+            )
+            # Streamed parts are previewed by "Export parts". Otherwise previews depend
+            # on the arrangement only: parts found in the preview cache are never made
+            if config.streaming is None:
+                build.add_target(
+                    ExportTarget(
+                        name="Export previews",
+                        resolve_func=lambda b, a: PegboardScript.export_previews(
+                            b, a, config.previews, config.workers
+                        ),
+                        dependencies=[prepare_target],
+                        input_keys=["previews", "workers"],
+                    )
+                )
+
+        if config.meshes is not None:
+            # Depends on the arrangement only: parts found in the mesh store are never made
+            build.add_target(
+                ExportTarget(
+                    name="Export meshes",
+                    resolve_func=lambda b, a: PegboardScript.export_meshes(
+                        b, a, config.meshes
+                    ),
+                    dependencies=[prepare_target],
+                    input_keys=["meshes"],
+                )
+            )
+
+        return build
+
+    @staticmethod
+    def parse_input(input_data: ScriptInput) -> PegboardScriptConfig:
+        if not isinstance(input_data.root, dict):
+            raise ScriptInputError("Script input must be a mapping")
+
+        try:
+            config = cattr.structure(input_data.root, PegboardScriptConfig)
+        except cattrs.BaseValidationError as e:
+            raise ScriptInputError(
+                "Invalid script input: " + "; ".join(cattrs.transform_error(e))
+            ) from e
+
+        if (config.pegboard is None) == (config.wall is None):
+            raise ScriptInputError(
+                "Script input must have either 'pegboard' or 'wall' but not both"
+            )
+        if config.wall is not None and not config.wall.boards:
+            raise ScriptInputError("Wall must have at least one board")
+        if config.workers is not None and config.workers < 1:
+            raise ScriptInputError("'workers' must be positive")
+
+        if config.pegboard is not None:
+            PegboardScript.check_board(config.pegboard, "pegboard")
+        else:
+            for i, board in enumerate(config.wall.boards):
+                PegboardScript.check_board(board, f"wall.boards[{i}]")
+        for i, row in enumerate(config.holders):
+            if not row.spool_thickness:
+                raise ScriptInputError(f"'holders[{i}].spool_thickness' is empty")
+            if any(t <= 0 for t in row.spool_thickness):
+                raise ScriptInputError(
+                    f"'holders[{i}].spool_thickness' values must be positive"
+                )
+
+        return config
+
+    # Values that would make the layout fail or never finish
+    @staticmethod
+    def check_board(board: PegboardStructuredData, path: str):
+        for name in ["width", "height", "thickness"]:
+            if getattr(board, name) <= 0:
+                raise ScriptInputError(f"'{path}.{name}' must be positive")
+        for name in ["interval", "size"]:
+            value = getattr(board.holes, name)
+            if value.x <= 0 or value.y <= 0:
+                raise ScriptInputError(f"'{path}.holes.{name}' must be positive")
 
     @staticmethod
     def make_arrangement(
-        input_data: ScriptInput, context: BuildContext
+        config: PegboardScriptConfig, context: BuildContext
     ) -> PegboardArrangement:
-        pegboard = Pegboard.deserialize(input_data.root["pegboard"])
-        arrangement = PegboardArrangement(pegboard)
+        if config.wall is not None:
+            arrangement = PegboardArrangement.from_wall(config.wall.make_wall())
+        else:
+            arrangement = PegboardArrangement(config.pegboard.make_pegboard())
 
-        @define
-        class HolderRowStructure:
-            spool_thickness: list[ExactNum]
-            expand: bool
-            pos: Vec2
-
-        holder_rows: list[HolderRowStructure] = cattr.structure(
-            input_data.root["holders"], list[HolderRowStructure]
-        )
-        for row in holder_rows:
+        for row in config.holders:
             arrangement.add_holders_row(
                 Hook(), row.spool_thickness, expand=row.expand, pos=row.pos
             )
@@ -62,11 +269,166 @@ class PegboardScript(Script):
 
     @staticmethod
     def make_assembly(
-        context: BuildContext, arrangement: PegboardArrangement
+        context: BuildContext,
+        arrangement: PegboardArrangement,
+        workers: Optional[int] = None,
     ) -> ExactCqWrapper:
-        made_assembly = arrangement.make(wrap_cq_object(cq.Workplane("XY")))
-        return made_assembly
+        if workers == 1:
+            return arrangement.make(wrap_cq_object(cq.Workplane("XY")))
+        # Each board & holder is made in a separate process
+        return arrangement.make_parallel(max_workers=workers)
+
+    @staticmethod
+    def export_to_step(
+        context: BuildContext, asm: ExactCqWrapper, path: str = "pegboard.step"
+    ):
+        with atomic_output(path) as tmp_path:
+            asm.save(tmp_path)
+
+    # Every part is exported to its own file (and previewed) as soon as it is made
+    # & then released, unless the combined assembly is requested
+    @staticmethod
+    def export_parts_streaming(
+        context: BuildContext,
+        arrangement: PegboardArrangement,
+        streaming: StreamingStructure,
+        output: str,
+        workers: Optional[int] = None,
+        previews: Optional[PreviewsStructure] = None,
+    ):
+        os.makedirs(streaming.directory, exist_ok=True)
+        asm = wrap_cq_object(cq.Assembly()) if streaming.combined else None
+
+        if workers == 1:
+            parts = arrangement.iter_parts(xy_workplane())
+        else:
+            parts = arrangement.iter_parts_parallel(workers, ordered=False)
+
+        with contextlib.ExitStack() as stack:
+            preview_exporter = None
+            if previews is not None:
+                preview_exporter = stack.enter_context(
+                    PreviewExporter(
+                        previews.directory,
+                        SvgCache(previews.cache),
+                        max_workers=workers,
+                    )
+                )
+
+            for name, part, color in parts:
+                path = os.path.join(streaming.directory, f"{name}.step")
+                with atomic_output(path) as tmp_path:
+                    cq.exporters.export(unwrap_cq_object(part), tmp_path)
+                log().info('Exported "%s"', path)
+                if preview_exporter is not None:
+                    preview_exporter.add(name, part)
+                if asm is not None:
+                    asm = asm.add(part, color=color, name=name)
+
+        if preview_exporter is not None:
+            log().info(
+                "%d previews are written to %s",
+                len(preview_exporter.paths),
+                previews.directory,
+            )
+        if asm is not None:
+            PegboardScript.export_to_step(context, asm, output)
+
+    @staticmethod
+    def export_layout_preview(
+        context: BuildContext,
+        arrangement: PegboardArrangement,
+        previews: PreviewsStructure,
+    ):
+        os.makedirs(previews.directory, exist_ok=True)
+        with atomic_output(os.path.join(previews.directory, "layout.svg")) as tmp_path:
+            with open(tmp_path, "wt") as f:
+                f.write(make_layout_svg(arrangement))
+
+    @staticmethod
+    def export_previews(
+        context: BuildContext,
+        arrangement: PegboardArrangement,
+        previews: PreviewsStructure,
+        workers: Optional[int] = None,
+    ):
+        n_made = 0
+        with PreviewExporter(
+            previews.directory, SvgCache(previews.cache), max_workers=workers
+        ) as exporter:
+            for i, board in enumerate(arrangement.boards):
+                n_made += exporter.add_made(
+                    [arrangement.board_name(i)],
+                    [board.geometry_key()],
+                    make_board_brep,
+                    board,
+                )
+            for i, holder in enumerate(arrangement.spool_holders):
+                key = holder.geometry_key()
+                n_made += exporter.add_made(
+                    [f"H{i} - Holder", f"H{i} - Separator"],
+                    [f"{key}:holder", f"{key}:separator"],
+                    make_holder_breps,
+                    holder,
+                )
+
+        log().info(
+            "%d previews are written to %s, %d of %d groups of parts were made",
+            len(exporter.paths),
+            previews.directory,
+            n_made,
+            len(arrangement.boards) + len(arrangement.spool_holders),
+        )
 
     @staticmethod
-    def export_to_step(context: BuildContext, asm: ExactCqWrapper):
-        asm.save("pegboard.step")
+    def export_meshes(
+        context: BuildContext,
+        arrangement: PegboardArrangement,
+        meshes: MeshesStructure,
+    ):
+        store = MeshStore(meshes.store)
+        os.makedirs(meshes.directory, exist_ok=True)
+
+        # Parts that are made together: names, geometry keys & a function that makes them
+        groups = [
+            (
+                [arrangement.board_name(i)],
+                [board.geometry_key()],
+                lambda b=board: [b.make(xy_workplane().transformed(rotate=(90, 0, 0)))],
+            )
+            for i, board in enumerate(arrangement.boards)
+        ]
+        for i, holder in enumerate(arrangement.spool_holders):
+            key = holder.geometry_key()
+            groups.append(
+                (
+                    [f"H{i} - Holder", f"H{i} - Separator"],
+                    [f"{key}:holder", f"{key}:separator"],
+                    lambda h=holder: list(h.make(xy_workplane())),
+                )
+            )
+
+        n_made = 0
+        for names, geometry_keys, make in groups:
+            keys = [
+                MeshStore.key(k, meshes.tolerance, meshes.angular_tolerance)
+                for k in geometry_keys
+            ]
+            group_meshes = [store.get(k) for k in keys]
+            if any(m is None for m in group_meshes):
+                n_made += 1
+                group_meshes = [
+                    store.put(
+                        k, tessellate(part, meshes.tolerance, meshes.angular_tolerance)
+                    )
+                    for k, part in zip(keys, make())
+                ]
+            for name, mesh in zip(names, group_meshes):
+                write_binary_stl(mesh, os.path.join(meshes.directory, f"{name}.stl"))
+
+        log().info(
+            "Meshes are written to %s, %d of %d groups of parts were made",
+            meshes.directory,
+            n_made,
+            len(groups),
+        )
@@ -1,11 +1,15 @@
-from copy import copy
+import hashlib
 from decimal import Decimal
 
+import attr
 from attr import define, field
 
 from wisp3d.utility import to_exact_single, to_exact_list, to_float, Rect, AnyNum
 from .pegboard import Hook, Pegboard, Hole
 
+# Has to be increased whenever SpoolHolder.make or Hook.make change the geometry they produce
+geometry_version = 1
+
 
 @define
 class SpoolHolder:
@@ -54,6 +58,28 @@ class SpoolHolder:
 
         return mk(0), mk(tolerance)
 
+    # Holes the holder is attached to.
+    # Hooks can be added only to part of side that is not rounded.
+    def attached_holes(self) -> list[Hole]:
+        rect_with_hooks = Rect(
+            self.rect.min_x,
+            self.rect.min_y + self.fillet_outer_r1,
+            self.rect.width,
+            self.rect.height - self.fillet_outer_r1,
+        )
+        return self.pegboard.find_holes_that_can_be_attached_to_rect_with_hook(
+            rect_with_hooks, self.hook
+        )
+
+    # Hash of everything that defines the made geometry, computed without making it
+    def geometry_key(self) -> str:
+        params = attr.asdict(
+            self, recurse=False, filter=lambda a, v: a.name != "pegboard"
+        )
+        return hashlib.sha256(
+            repr((geometry_version, params, self.attached_holes())).encode()
+        ).hexdigest()
+
     # Preconditions:
     # XZ = pegboard front plane, +X = right, +Z = up, origin is pegboard lower left corner
     # Y directed inside pegboard
@@ -188,15 +214,8 @@ class SpoolHolder:
                 .extrude(self.rect.width)
             )
 
-        # Find part of side that is not rounded, we can add hooks only to that part
-        rect_with_hooks = copy(self.rect)
-        rect_with_hooks.min_y += self.fillet_outer_r1
-        rect_with_hooks.height -= self.fillet_outer_r1
-
         # Add hooks & make cuts for closed holes
-        for hole in self.pegboard.find_holes_that_can_be_attached_to_rect_with_hook(
-            rect_with_hooks, self.hook
-        ):
+        for hole in self.attached_holes():
             hole_centered_wp = wp.transformed(offset=(hole.center_x, 0, hole.center_y))
             if not hole.closed:
                 # Add a hook
@@ -0,0 +1,87 @@
+import hashlib
+
+import attr
+from attr import define, field
+import cattr
+from cattr.gen import make_dict_structure_fn
+
+from wisp3d.utility import Vec2
+from .pegboard import Pegboard, PegboardStructuredData
+
+
+# Pegboard hung on a wall, offset is a position of the pegboard left-bottom corner on the wall
+@define
+class WallBoard:
+    pegboard: Pegboard = field()
+    offset: Vec2 = field(factory=lambda: Vec2(0, 0))
+
+    def geometry_key(self) -> str:
+        return hashlib.sha256(
+            repr((self.pegboard.geometry_key(), self.offset)).encode()
+        ).hexdigest()
+
+    # Preconditions: same as for Pegboard.make, origin is the wall left-bottom corner
+    def make(self, wp):
+        return self.pegboard.make(
+            wp.transformed(offset=(self.offset.x, self.offset.y, 0))
+        )
+
+
+# Config of a pegboard on a wall
+@define
+class WallBoardStructuredData(PegboardStructuredData):
+    offset: Vec2 = Vec2(0, 0)
+
+
+# Config of a wall
+@define
+class WallStructuredData:
+    boards: list[WallBoardStructuredData]
+
+    def make_wall(self) -> "PegboardWall":
+        if not self.boards:
+            raise ValueError("Wall must have at least one board")
+        return PegboardWall(
+            boards=[
+                WallBoard(pegboard=b.make_pegboard(), offset=b.offset)
+                for b in self.boards
+            ]
+        )
+
+
+# Several pegboards side by side, holders can be attached to holes of different boards
+@define
+class PegboardWall:
+    boards: list[WallBoard] = field(factory=list)
+
+    @staticmethod
+    def deserialize(data) -> "PegboardWall":
+        return cattr.structure(data, WallStructuredData).make_wall()
+
+    # Single pegboard that covers the whole wall and has holes of all boards,
+    # it is used to arrange holders but is never made itself
+    def layout_pegboard(self) -> Pegboard:
+        layout = Pegboard(
+            width=max(b.offset.x + b.pegboard.width for b in self.boards),
+            height=max(b.offset.y + b.pegboard.height for b in self.boards),
+            thickness=max(b.pegboard.thickness for b in self.boards),
+        )
+        for board in self.boards:
+            layout.holes += [
+                attr.evolve(
+                    h,
+                    center_x=h.center_x + board.offset.x,
+                    center_y=h.center_y + board.offset.y,
+                )
+                for h in board.pegboard.holes
+            ]
+        return layout
+
+
+for _cls in [WallBoardStructuredData, WallStructuredData]:
+    cattr.register_structure_hook(
+        _cls,
+        make_dict_structure_fn(
+            _cls, cattr.global_converter, _cattrs_forbid_extra_keys=True
+        ),
+    )
@@ -1,3 +1,4 @@
 from .build import Build
 from .export_target import ExportTarget
-from .script import Script, ScriptInput
+from .script import Script, ScriptInput, ScriptInputError
+from .registry import ScriptRegistry, default_registry, load_script
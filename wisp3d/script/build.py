@@ -1,65 +1,71 @@
-import logging
-import sys
 import contextlib
 from typing import Optional
 
 from attr import define, field
 from uuid import UUID, uuid4
-from logging import Logger, LoggerAdapter
+from logging import LoggerAdapter
 
 from .export_target import ExportTarget, BuildContext
-from wisp3d.utility import set_threadlocal_log_adapter, log
+from wisp3d.utility import (
+    set_threadlocal_log_adapter,
+    get_threadlocal_log_adapter,
+    log,
+    QueueLogging,
+)
+
+# Logging of all builds goes through a single queue-backed handler
+build_log = QueueLogging("build")
+
+
+# Adds build id & current target name to every record
+class BuildLogAdapter(LoggerAdapter):
+    def __init__(self, context: "BuildContextImpl"):
+        super().__init__(build_log.logger, {})
+        self.context = context
+
+    def process(self, msg, kwargs):
+        target = self.context.current_target
+        kwargs["extra"] = {
+            "build_id": str(self.context.build.id),
+            "target": target.name if target is not None else None,
+        }
+        return msg, kwargs
 
 
 @define
 class BuildContextImpl(BuildContext):
     build: "Build"
     current_target: Optional[ExportTarget] = field(default=None)
-    _logger: Logger = field(init=False)
+    _log_adapter: LoggerAdapter = field(init=False)
+    _session_depth: int = field(init=False, default=0)
 
     def __attrs_post_init__(self):
-        # Setup logger
-        log_level = logging.DEBUG
-        self._logger = logging.getLogger("build")
-        self._logger.setLevel(log_level)
-        ch = logging.StreamHandler(sys.stdout)
-        ch.setLevel(log_level)
-        formatter = logging.Formatter("%(color)s%(indent)s%(message)s%(reset_color)s")
-        ch.setFormatter(formatter)
-        self._logger.addHandler(ch)
-
-        # Setup logger adapter
-        self.update_log_adapter()
-
-    def update_log_adapter(self):
-        blue = "\x1b[1;34m"
-        green = "\x1b[1;32m"
-        gray = "\x1b[0;37m"
-        reset = "\x1b[0m"
-
-        if self.current_target is not None:
-            color = gray
-            indent = "  "
-        else:
-            color = blue
-            indent = ""
-
-        # Set current logger adapter
-        logger_adapter = LoggerAdapter(
-            self._logger, extra={"indent": indent, "color": color, "reset_color": reset}
-        )
-        set_threadlocal_log_adapter(logger_adapter)
+        self._log_adapter = BuildLogAdapter(self)
+
+    # Logging is set up when the outermost session starts and torn down when it finishes
+    @contextlib.contextmanager
+    def session(self):
+        old_adapter = get_threadlocal_log_adapter()
+        if self._session_depth == 0:
+            build_log.acquire()
+        self._session_depth += 1
+        set_threadlocal_log_adapter(self._log_adapter)
+        try:
+            yield None
+        finally:
+            set_threadlocal_log_adapter(old_adapter)
+            self._session_depth -= 1
+            if self._session_depth == 0:
+                build_log.release()
 
     @contextlib.contextmanager
     def set_target(self, target: ExportTarget):
         old_target = self.current_target
         self.current_target = target
-        self.update_log_adapter()
         try:
             yield None
         finally:
             self.current_target = old_target
-            self.update_log_adapter()
 
 
 @define
@@ -84,20 +90,43 @@ class Build:
 
         return self
 
+    # Copies artifacts of targets whose inputs didn't change since the previous build.
+    # Targets are matched by name, changed_keys are top-level keys of the script input that changed.
+    def reuse_artifacts(
+        self, previous: "Build", changed_keys: set[str]
+    ) -> list[ExportTarget]:
+        previous_targets = {t.name: t for t in previous.targets}
+        reused = []
+        # Dependencies go before dependent targets
+        for target in self.targets:
+            previous_target = previous_targets.get(target.name)
+            if (
+                previous_target is not None
+                and previous_target in previous.artifacts
+                and target.input_keys is not None
+                and not changed_keys.intersection(target.input_keys)
+                and all(dep in reused for dep in target.dependencies)
+            ):
+                self.artifacts[target] = previous.artifacts[previous_target]
+                reused.append(target)
+        return reused
+
     def resolve(self, target: ExportTarget) -> object:
         if target in self.artifacts:
             # Already resolved
             return self.artifacts[target]
 
-        # Resolve dependencies
-        resolved_deps = [self.resolve(dep) for dep in target.dependencies]
+        with self.context.session():
+            # Resolve dependencies
+            resolved_deps = [self.resolve(dep) for dep in target.dependencies]
 
-        log().info('Resolving target: "%s"', target.name)
-        with self.context.set_target(target):
-            # Resolve target in a context (context defined log messages format)
-            self.artifacts[target] = target.compute(self.context, resolved_deps)
-            return self.artifacts[target]
+            log().info('Resolving target: "%s"', target.name)
+            with self.context.set_target(target):
+                # Resolve target in a context (context defines log records fields)
+                self.artifacts[target] = target.compute(self.context, resolved_deps)
+                return self.artifacts[target]
 
     def resolve_all(self):
-        for target in self.targets:
-            self.resolve(target)
+        with self.context.session():
+            for target in self.targets:
+                self.resolve(target)
@@ -0,0 +1,474 @@
+import argparse
+import hashlib
+import hmac
+import ipaddress
+import multiprocessing
+import os
+import pickle
+import secrets
+import socket
+import struct
+import threading
+import traceback
+from collections import Counter, deque
+from typing import Optional, Union
+
+from .build import Build
+from .export_target import ExportTarget
+from .registry import load_script
+from .script import Script, ScriptInput
+from wisp3d.utility import encode_artifact, decode_artifact, log
+
+# ("host", port) for TCP or a path for a Unix socket
+Address = Union[tuple[str, int], str]
+
+# Protocol: a handshake proves to both sides that the other one knows the shared key,
+# the coordinator proves it first. Then every message is a pickled tuple prefixed with
+# its length & HMAC, messages are unpickled only after the HMAC is checked.
+# Handshake & message HMACs are made with different keys, so one can't stand for another:
+#   handshake - the shared key, over a label, the role of the signer & both challenges;
+#   messages - a session key derived from both challenges, over the direction,
+#   the sequence number of the message & its data.
+#   worker -> coordinator: ("hello",), ("next",), ("done", target, artifact), ("failed", target, error)
+#   coordinator -> worker: ("setup", script, input), ("task", target, deps_artifacts), ("stop",)
+# Artifacts are encoded with encode_artifact, shapes are sent as BREP.
+header = struct.Struct("!Q")
+sequence = struct.Struct("!Q")
+digest_size = hashlib.sha256().digest_size
+challenge_size = 32
+handshake_label = b"wisp3d-challenge\0"
+session_label = b"wisp3d-session\0"
+
+# Shared key of a coordinator & its workers, unless a key file is given
+key_env_var = "WISP3D_DISTRIBUTED_KEY"
+
+
+class DistributedBuildError(RuntimeError):
+    pass
+
+
+class AuthenticationError(ConnectionError):
+    pass
+
+
+def load_key(key_file: Optional[str] = None) -> Optional[bytes]:
+    if key_file is not None:
+        with open(key_file, "rb") as f:
+            key = f.read().strip()
+    else:
+        key = os.environ.get(key_env_var, "").encode()
+    return key or None
+
+
+def is_loopback(address: Address) -> bool:
+    if isinstance(address, str):
+        # Unix socket
+        return True
+    host = address[0]
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def sign(key: bytes, data: bytes) -> bytes:
+    return hmac.new(key, data, hashlib.sha256).digest()
+
+
+def recv_exactly(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+# Authenticated connection after the handshake, messages of each direction are numbered
+# so that they can't be replayed, reordered or reflected
+class Channel:
+    def __init__(
+        self,
+        sock: socket.socket,
+        session_key: bytes,
+        send_direction: bytes,
+        recv_direction: bytes,
+    ):
+        self.sock = sock
+        self.session_key = session_key
+        self.send_direction = send_direction
+        self.recv_direction = recv_direction
+        self.sent = 0
+        self.received = 0
+
+    def _sign(self, direction: bytes, number: int, data: bytes) -> bytes:
+        return sign(self.session_key, direction + sequence.pack(number) + data)
+
+    def send(self, message: tuple):
+        data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+        digest = self._sign(self.send_direction, self.sent, data)
+        self.sent += 1
+        self.sock.sendall(header.pack(len(data)) + digest + data)
+
+    def recv(self) -> tuple:
+        (size,) = header.unpack(recv_exactly(self.sock, header.size))
+        digest = recv_exactly(self.sock, digest_size)
+        data = recv_exactly(self.sock, size)
+        expected = self._sign(self.recv_direction, self.received, data)
+        if not hmac.compare_digest(digest, expected):
+            raise AuthenticationError("Message signature doesn't match the key")
+        self.received += 1
+        return pickle.loads(data)
+
+
+def handshake_digest(key: bytes, role: bytes, challenges: bytes) -> bytes:
+    return sign(key, handshake_label + role + b"\0" + challenges)
+
+
+def session_key(key: bytes, challenges: bytes) -> bytes:
+    return sign(key, session_label + challenges)
+
+
+# Both sides send a challenge, the coordinator signs them first & the worker answers
+# only after it has checked the coordinator. Nothing is unpickled before that.
+def coordinator_handshake(sock: socket.socket, key: bytes) -> Channel:
+    coordinator_challenge = secrets.token_bytes(challenge_size)
+    sock.sendall(coordinator_challenge)
+    challenges = coordinator_challenge + recv_exactly(sock, challenge_size)
+    sock.sendall(handshake_digest(key, b"coordinator", challenges))
+    answer = recv_exactly(sock, digest_size)
+    if not hmac.compare_digest(answer, handshake_digest(key, b"worker", challenges)):
+        raise AuthenticationError("Worker doesn't know the key")
+    return Channel(sock, session_key(key, challenges), b"to worker", b"to coordinator")
+
+
+def worker_handshake(sock: socket.socket, key: bytes) -> Channel:
+    worker_challenge = secrets.token_bytes(challenge_size)
+    challenges = recv_exactly(sock, challenge_size) + worker_challenge
+    sock.sendall(worker_challenge)
+    proof = recv_exactly(sock, digest_size)
+    if not hmac.compare_digest(
+        proof, handshake_digest(key, b"coordinator", challenges)
+    ):
+        raise AuthenticationError("Coordinator doesn't know the key")
+    sock.sendall(handshake_digest(key, b"worker", challenges))
+    return Channel(sock, session_key(key, challenges), b"to coordinator", b"to worker")
+
+
+def make_socket(address: Address) -> socket.socket:
+    family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+    return socket.socket(family, socket.SOCK_STREAM)
+
+
+def run_worker(address: Address, key: bytes):
+    sock = make_socket(address)
+    sock.connect(address)
+    with sock:
+        channel = worker_handshake(sock, key)
+        channel.send(("hello",))
+        _, script_ref, input_data = channel.recv()
+        script: Script = load_script(script_ref)
+        build = script.create_build(input_data)
+        targets = {t.name: t for t in build.targets}
+        # Artifacts this worker has made or received, the coordinator doesn't send them again
+        artifacts = {}
+
+        while True:
+            channel.send(("next",))
+            message = channel.recv()
+            if message[0] == "stop":
+                return
+
+            _, name, deps_artifacts = message
+            for dep_name, encoded in deps_artifacts.items():
+                artifacts[dep_name] = decode_artifact(encoded)
+            target = targets[name]
+            try:
+                with build.context.session(), build.context.set_target(target):
+                    artifact = target.compute(
+                        build.context,
+                        [artifacts[dep.name] for dep in target.dependencies],
+                    )
+                artifacts[name] = artifact
+                channel.send(("done", name, encode_artifact(artifact)))
+            except Exception:
+                channel.send(("failed", name, traceback.format_exc()))
+
+
+# Connected worker: queue of tasks assigned to it & names of artifacts it already has
+class WorkerState:
+    def __init__(self, worker_id: int):
+        self.id = worker_id
+        self.queue: deque[str] = deque()
+        self.artifacts: set[str] = set()
+
+
+# Distributes targets of a build among workers connected through a socket.
+# A target becomes ready when all its dependencies are done. It is queued to the worker
+# that made its first dependency (that worker doesn't need dependency artifacts to be sent),
+# idle workers steal tasks from the tail of the longest queue.
+# Tasks of failed or disconnected workers are retried up to max_retries times.
+# Side effects of targets (e.g. exported files) happen on the worker machines.
+# script_ref is a registered script name or a "module:Class" reference.
+# Without a key only local workers can connect: a random key is made for them,
+# and the address must be a loopback one.
+class DistributedBuild:
+    def __init__(
+        self,
+        script_ref: str,
+        input_data: ScriptInput,
+        address: Address = ("127.0.0.1", 0),
+        max_retries: int = 2,
+        key: Optional[bytes] = None,
+    ):
+        if key is None and not is_loopback(address):
+            raise DistributedBuildError(
+                f"A key is needed to listen on {address[0]}, "
+                f"set {key_env_var} or pass a key file"
+            )
+        self.script_ref = script_ref
+        self.input_data = input_data
+        self.address = address
+        self.max_retries = max_retries
+        self.key = key if key is not None else secrets.token_bytes(32)
+        self.build: Build = load_script(script_ref).create_build(input_data)
+
+        self._cond = threading.Condition()
+        self._targets: dict[str, ExportTarget] = {t.name: t for t in self.build.targets}
+        self._dependents: dict[str, list[str]] = {name: [] for name in self._targets}
+        self._waiting_for: dict[str, set[str]] = {}
+        for target in self.build.targets:
+            self._waiting_for[target.name] = {d.name for d in target.dependencies}
+            for dep in target.dependencies:
+                self._dependents[dep.name].append(target.name)
+
+        self._workers: dict[int, WorkerState] = {}
+        self._next_worker_id = 0
+        self._unassigned: deque[str] = deque()
+        self._running: dict[str, int] = {}
+        self._producer: dict[str, int] = {}
+        self._done: dict[str, tuple] = {}
+        self._attempts: Counter = Counter()
+        self._error: Optional[str] = None
+        self._stopped = False
+
+        for name, deps in self._waiting_for.items():
+            if not deps:
+                self._unassigned.append(name)
+
+    @property
+    def finished(self) -> bool:
+        return self._error is not None or len(self._done) == len(self._targets)
+
+    def _make_ready(self, name: str):
+        deps = self._targets[name].dependencies
+        producer = self._producer.get(deps[0].name) if deps else None
+        if producer in self._workers:
+            self._workers[producer].queue.append(name)
+        else:
+            self._unassigned.append(name)
+
+    def _take_task(self, worker: WorkerState) -> Optional[str]:
+        if worker.queue:
+            return worker.queue.popleft()
+        if self._unassigned:
+            return self._unassigned.popleft()
+        victim = max(self._workers.values(), key=lambda w: len(w.queue))
+        if victim.queue:
+            return victim.queue.pop()
+        return None
+
+    def _task_failed(self, name: str, error: str):
+        self._running.pop(name, None)
+        self._attempts[name] += 1
+        if self._attempts[name] > self.max_retries:
+            self._error = f'Target "{name}" failed:\n{error}'
+        else:
+            log().warning('Target "%s" failed, retrying', name)
+            self._unassigned.append(name)
+        self._cond.notify_all()
+
+    def _task_done(self, worker: WorkerState, name: str, encoded: tuple):
+        self._running.pop(name, None)
+        self._done[name] = encoded
+        self._producer[name] = worker.id
+        worker.artifacts.add(name)
+        for dependent in self._dependents[name]:
+            self._waiting_for[dependent].discard(name)
+            if not self._waiting_for[dependent]:
+                self._make_ready(dependent)
+        self._cond.notify_all()
+
+    def _serve(self, sock: socket.socket):
+        with self._cond:
+            worker = WorkerState(self._next_worker_id)
+            self._next_worker_id += 1
+            self._workers[worker.id] = worker
+
+        current: Optional[str] = None
+        error = "Worker disconnected"
+        try:
+            with sock:
+                channel = coordinator_handshake(sock, self.key)
+                channel.recv()
+                channel.send(("setup", self.script_ref, self.input_data))
+                while True:
+                    message = channel.recv()
+                    # A worker may only report the task it was given & ask for a new
+                    # one when it has none
+                    if message[0] in ("done", "failed"):
+                        if message[1] != current:
+                            raise ValueError(f"Unexpected report for {message[1]!r}")
+                    elif message[0] != "next" or current is not None:
+                        raise ValueError(f"Unexpected message {message[0]!r}")
+                    if message[0] == "done":
+                        with self._cond:
+                            self._task_done(worker, message[1], message[2])
+                        current = None
+                        continue
+                    if message[0] == "failed":
+                        with self._cond:
+                            self._task_failed(message[1], message[2])
+                        current = None
+                        continue
+
+                    # "next": wait until there is a task or the build is finished
+                    with self._cond:
+                        while not self.finished and not self._stopped:
+                            current = self._take_task(worker)
+                            if current is not None:
+                                break
+                            self._cond.wait()
+                        if current is None:
+                            channel.send(("stop",))
+                            return
+                        self._running[current] = worker.id
+                        deps = {
+                            d.name: self._done[d.name]
+                            for d in self._targets[current].dependencies
+                            if d.name not in worker.artifacts
+                        }
+                        worker.artifacts.update(deps)
+                    channel.send(("task", current, deps))
+        except AuthenticationError as e:
+            log().warning("Connection is rejected: %s", e)
+            error = f"Worker connection is rejected: {e}"
+        except (ConnectionError, OSError, EOFError) as e:
+            error = f"Worker disconnected: {e}"
+        except Exception:
+            # E.g. an unexpected message, the connection is dropped
+            log().exception("Worker connection failed")
+            error = f"Worker connection failed:\n{traceback.format_exc()}"
+        finally:
+            with self._cond:
+                # A task that the worker didn't finish is retried by others
+                if current is not None:
+                    self._task_failed(current, error)
+                del self._workers[worker.id]
+                # Tasks queued to the worker can be taken by anyone
+                self._unassigned.extend(worker.queue)
+                self._cond.notify_all()
+
+    def _accept(self, server: socket.socket):
+        while True:
+            try:
+                sock, _ = server.accept()
+            except OSError:
+                # The server socket is closed
+                return
+            threading.Thread(target=self._serve, args=(sock,), daemon=True).start()
+
+    # Resolves all targets, local_workers processes are started on this machine,
+    # other workers may connect to the address with run_worker
+    def resolve_all(self, local_workers: int = 0) -> Build:
+        server = make_socket(self.address)
+        server.bind(self.address)
+        server.listen()
+        self.address = server.getsockname()
+        threading.Thread(target=self._accept, args=(server,), daemon=True).start()
+
+        mp_context = multiprocessing.get_context("spawn")
+        processes = [
+            mp_context.Process(target=run_worker, args=(self.address, self.key))
+            for _ in range(local_workers)
+        ]
+        for p in processes:
+            p.start()
+
+        try:
+            with self._cond:
+                while not self.finished:
+                    # Fail if all local workers are dead & there are no remote ones
+                    if processes and not self._workers:
+                        if not any(p.is_alive() for p in processes):
+                            self._error = "All workers exited"
+                            break
+                    self._cond.wait(timeout=1)
+        finally:
+            with self._cond:
+                self._stopped = True
+                self._cond.notify_all()
+            server.close()
+            if isinstance(self.address, str):
+                os.remove(self.address)
+            for p in processes:
+                p.join()
+
+        if self._error is not None:
+            raise DistributedBuildError(self._error)
+
+        for name, encoded in self._done.items():
+            self.build.artifacts[self._targets[name]] = decode_artifact(encoded)
+        return self.build
+
+
+def parse_address(value: str) -> Address:
+    host, sep, port = value.rpartition(":")
+    if sep and port.isdigit():
+        return host, int(port)
+    return value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distributed builds")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    worker_parser = subparsers.add_parser("worker", help="connect to a coordinator")
+    worker_parser.add_argument("address", help="HOST:PORT or a Unix socket path")
+    worker_parser.add_argument(
+        "--key-file", help=f"file with the shared key, {key_env_var} by default"
+    )
+    build_parser = subparsers.add_parser("build", help="run a coordinator")
+    build_parser.add_argument("config")
+    build_parser.add_argument(
+        "--script", default="pegboard", help='registered name or "module:Class"'
+    )
+    build_parser.add_argument("--listen", default="127.0.0.1:0")
+    build_parser.add_argument("--workers", type=int, default=2)
+    build_parser.add_argument("--max-retries", type=int, default=2)
+    build_parser.add_argument(
+        "--key-file",
+        help=f"file with the shared key, {key_env_var} by default; "
+        "needed for remote workers",
+    )
+    args = parser.parse_args()
+
+    key = load_key(args.key_file)
+    if args.command == "worker":
+        if key is None:
+            parser.error(f"A key is needed: set {key_env_var} or pass --key-file")
+        run_worker(parse_address(args.address), key)
+    else:
+        try:
+            DistributedBuild(
+                args.script,
+                ScriptInput.from_file(args.config),
+                address=parse_address(args.listen),
+                max_retries=args.max_retries,
+                key=key,
+            ).resolve_all(local_workers=args.workers)
+        except DistributedBuildError as e:
+            parser.exit(1, f"{e}\n")
@@ -2,7 +2,7 @@ from logging import Logger
 
 from attr import define, field
 from uuid import UUID, uuid4
-from typing import Callable
+from typing import Callable, Optional
 
 
 class BuildContext:
@@ -15,6 +15,8 @@ class ExportTarget:
     resolve_func: Callable[[BuildContext, ...], object]
     id: UUID = field(factory=uuid4)
     dependencies: list["ExportTarget"] = field(factory=list)
+    # Top-level keys of the script input that are used by the target itself, None = all keys
+    input_keys: Optional[list[str]] = field(default=None)
 
     def compute(self, context: BuildContext, deps: list[object]):
         return self.resolve_func(context, *deps)
@@ -0,0 +1,122 @@
+import importlib
+import json
+import os
+import threading
+import time
+from importlib.metadata import entry_points
+from typing import Optional
+
+import yaml
+from attr import define, field
+
+from .script import Script, YamlLoader
+
+# Entry point group where other packages declare their scripts, e.g. in pyproject.toml:
+#   [project.entry-points."wisp3d.scripts"]
+#   my_script = "my_package.my_module:MyScript"
+entry_point_group = "wisp3d.scripts"
+
+builtin_scripts = {
+    "pegboard": "wisp3d.pegboard.pegboard_script:PegboardScript",
+}
+
+
+# Loads an object by a "module:attribute" reference
+def load_object(ref: str):
+    module_name, _, attr_name = ref.partition(":")
+    return getattr(importlib.import_module(module_name), attr_name)
+
+
+@define
+class ScriptEntry:
+    name: str
+    # "module:Class" reference, the module is imported on first use
+    ref: str
+    script_class: Optional[type] = field(default=None)
+    # Seconds spent to import the script module (with everything it imports)
+    import_time: Optional[float] = field(default=None)
+
+
+# Scripts declared by name, their modules (and CadQuery) are imported only when a script is used
+class ScriptRegistry:
+    def __init__(self):
+        self._entries: dict[str, ScriptEntry] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, ref: str):
+        self._entries[name] = ScriptEntry(name=name, ref=ref)
+
+    def load_entry_points(self, group: str = entry_point_group):
+        for ep in entry_points(group=group):
+            self.register(ep.name, ep.value)
+
+    # Manifest is a YAML or JSON mapping: script name -> "module:Class"
+    def load_manifest(self, path: str):
+        with open(path, "rt") as f:
+            content = f.read()
+        if os.path.splitext(path)[1].lower() == ".json":
+            manifest = json.loads(content)
+        else:
+            manifest = yaml.load(content, Loader=YamlLoader)
+        for name, ref in manifest.items():
+            self.register(name, ref)
+
+    def names(self) -> list[str]:
+        return list(self._entries.keys())
+
+    def get(self, name: str) -> type[Script]:
+        try:
+            entry = self._entries[name]
+        except KeyError:
+            raise KeyError(f'Unknown script "{name}"') from None
+
+        with self._lock:
+            if entry.script_class is None:
+                start = time.perf_counter()
+                script_class = load_object(entry.ref)
+                entry.import_time = time.perf_counter() - start
+                if not issubclass(script_class, Script):
+                    raise TypeError(f"{entry.ref} is not a Script")
+                entry.script_class = script_class
+        return entry.script_class
+
+    def create(self, name: str) -> Script:
+        return self.get(name)()
+
+    # Imports given scripts (all by default), e.g. when a worker starts.
+    # Returns import time of each script.
+    def preload(self, names: Optional[list[str]] = None) -> dict[str, float]:
+        names = names if names is not None else self.names()
+        for name in names:
+            self.get(name)
+        return self.import_times(names)
+
+    def import_times(self, names: Optional[list[str]] = None) -> dict[str, float]:
+        names = names if names is not None else self.names()
+        return {
+            name: self._entries[name].import_time
+            for name in names
+            if self._entries[name].import_time is not None
+        }
+
+
+_default_registry: Optional[ScriptRegistry] = None
+
+
+# Registry with built-in scripts & scripts declared with entry points
+def default_registry() -> ScriptRegistry:
+    global _default_registry
+    if _default_registry is None:
+        registry = ScriptRegistry()
+        for name, ref in builtin_scripts.items():
+            registry.register(name, ref)
+        registry.load_entry_points()
+        _default_registry = registry
+    return _default_registry
+
+
+# Script by a registered name or by a "module:Class" reference
+def load_script(name_or_ref: str) -> Script:
+    if ":" in name_or_ref:
+        return load_object(name_or_ref)()
+    return default_registry().create(name_or_ref)
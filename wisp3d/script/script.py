@@ -1,4 +1,6 @@
 import abc
+import json
+import os
 from typing import Any
 
 import yaml
@@ -6,6 +8,14 @@ from attr import define
 
 from .build import Build
 
+# C-accelerated loader is used when PyYAML is built with libyaml
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+# Script input that doesn't match the script schema
+class ScriptInputError(ValueError):
+    pass
+
 
 @define
 class ScriptInput:
@@ -13,9 +23,28 @@ class ScriptInput:
 
     @staticmethod
     def from_yaml(content: str) -> "ScriptInput":
-        root = yaml.safe_load(content)
+        root = yaml.load(content, Loader=YamlLoader)
         return ScriptInput(root)
 
+    @staticmethod
+    def from_json(content: str) -> "ScriptInput":
+        return ScriptInput(json.loads(content))
+
+    # Top-level keys whose values differ between the inputs
+    def changed_keys(self, other: "ScriptInput") -> set[str]:
+        lhs = self.root if isinstance(self.root, dict) else {}
+        rhs = other.root if isinstance(other.root, dict) else {}
+        return {k for k in lhs.keys() | rhs.keys() if lhs.get(k) != rhs.get(k)}
+
+    # Format is chosen by the file extension, YAML is the default
+    @staticmethod
+    def from_file(path: str) -> "ScriptInput":
+        with open(path, "rt") as f:
+            content = f.read()
+        if os.path.splitext(path)[1].lower() == ".json":
+            return ScriptInput.from_json(content)
+        return ScriptInput.from_yaml(content)
+
 
 class Script(metaclass=abc.ABCMeta):
     @abc.abstractmethod
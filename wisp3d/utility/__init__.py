@@ -1,6 +1,7 @@
 from .exact_cq import (
     ExactCqWrapper,
     wrap_cq_object,
+    unwrap_cq_object,
     to_float,
     to_exact,
     convert_recursive,
@@ -10,4 +11,37 @@ from .exact_cq import (
     to_exact_list,
 )
 from .shape import Vec2, Rect
-from .log import set_threadlocal_log_adapter, log
+from .log import (
+    set_threadlocal_log_adapter,
+    get_threadlocal_log_adapter,
+    log,
+    QueueLogging,
+    JsonFormatter,
+    ColorFormatter,
+    color_stream_handler,
+    worker_logging,
+)
+from .files import atomic_output
+
+# Names from modules that need CadQuery, they are imported on first use
+_lazy_names = {
+    "shape_to_brep": ".brep",
+    "shape_from_brep": ".brep",
+    "encode_artifact": ".brep",
+    "decode_artifact": ".brep",
+    "SvgCache": ".preview",
+    "export_assembly_previews": ".preview",
+    "PreviewExporter": ".preview",
+    "Mesh": ".mesh_store",
+    "MeshStore": ".mesh_store",
+    "tessellate": ".mesh_store",
+    "write_binary_stl": ".mesh_store",
+}
+
+
+def __getattr__(name):
+    if name not in _lazy_names:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+
+    return getattr(importlib.import_module(_lazy_names[name], __name__), name)
@@ -0,0 +1,69 @@
+import io
+from typing import Union
+
+import cadquery as cq
+
+from .exact_cq import ExactCqWrapper, unwrap_cq_object
+
+
+# Single shape from a workplane (or a shape itself), workplanes with several objects give a compound
+def to_shape(obj: Union[ExactCqWrapper, cq.Workplane, cq.Shape]) -> cq.Shape:
+    obj = unwrap_cq_object(obj)
+    if isinstance(obj, cq.Shape):
+        return obj
+    shapes = [v for v in obj.vals() if isinstance(v, cq.Shape)]
+    if len(shapes) == 1:
+        return shapes[0]
+    return cq.Compound.makeCompound(shapes)
+
+
+# BREP is used to pass shapes between processes: OCC shapes can't be pickled
+def shape_to_brep(obj: Union[ExactCqWrapper, cq.Workplane, cq.Shape]) -> bytes:
+    buffer = io.BytesIO()
+    to_shape(obj).exportBrep(buffer)
+    return buffer.getvalue()
+
+
+def shape_from_brep(data: bytes) -> cq.Shape:
+    return cq.Shape.importBrep(io.BytesIO(data))
+
+
+# Artifacts are sent between processes & machines as (kind, payload):
+# shapes & assemblies as BREP, anything else is pickled as is
+def encode_artifact(artifact) -> tuple:
+    wrapped = isinstance(artifact, ExactCqWrapper)
+    obj = unwrap_cq_object(artifact)
+    if isinstance(obj, cq.Assembly):
+        children = [
+            (
+                child.name,
+                shape_to_brep(child.toCompound()),
+                child.color.toTuple() if child.color is not None else None,
+            )
+            for child in obj.children
+        ]
+        return "assembly", wrapped, children
+    if isinstance(obj, cq.Workplane):
+        return "workplane", wrapped, shape_to_brep(obj)
+    if isinstance(obj, cq.Shape):
+        return "shape", wrapped, shape_to_brep(obj)
+    return "object", False, artifact
+
+
+def decode_artifact(encoded: tuple):
+    kind, wrapped, payload = encoded
+    if kind == "assembly":
+        obj = cq.Assembly()
+        for name, brep, color in payload:
+            obj.add(
+                shape_from_brep(brep),
+                name=name,
+                color=cq.Color(*color) if color is not None else None,
+            )
+    elif kind == "workplane":
+        obj = cq.Workplane("XY").newObject([shape_from_brep(payload)])
+    elif kind == "shape":
+        obj = shape_from_brep(payload)
+    else:
+        return payload
+    return ExactCqWrapper(obj) if wrapped else obj
@@ -1,6 +1,8 @@
 from fractions import Fraction
-from typing import Union, List
-import cadquery as cq
+from typing import Union, List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import cadquery as cq
 
 # Define type of exact number
 import cattr
@@ -37,6 +39,19 @@ def to_exact(*args):
 cattr.register_structure_hook(ExactNum, lambda data, cl: to_exact_single(data))
 
 
+# CadQuery is imported on first use, so modules that only need exact numbers don't pull it in
+_wrapped_cq_types = None
+
+
+def wrapped_cq_types() -> tuple:
+    global _wrapped_cq_types
+    if _wrapped_cq_types is None:
+        import cadquery as cq
+
+        _wrapped_cq_types = (cq.Workplane, cq.Sketch, cq.Assembly)
+    return _wrapped_cq_types
+
+
 # CadQuery objects wrapper that converts fractions to floats when calling cq.Workplane or cq.Sketch methods
 class ExactCqWrapper(object):
     def __init__(self, base):
@@ -78,11 +93,7 @@ class ExactCqWrapper(object):
 
     @staticmethod
     def convert_result(result):
-        if (
-            isinstance(result, cq.Workplane)
-            or isinstance(result, cq.Sketch)
-            or isinstance(result, cq.Assembly)
-        ):
+        if isinstance(result, wrapped_cq_types()):
             return ExactCqWrapper(result)
         else:
             return result
@@ -106,5 +117,11 @@ class ExactCqWrapper(object):
         return arg
 
 
-def wrap_cq_object(w: Union[cq.Workplane, cq.Assembly, cq.Sketch]) -> ExactCqWrapper:
+def wrap_cq_object(
+    w: Union["cq.Workplane", "cq.Assembly", "cq.Sketch"],
+) -> ExactCqWrapper:
     return ExactCqWrapper(w)
+
+
+def unwrap_cq_object(w) -> Union["cq.Workplane", "cq.Assembly", "cq.Sketch"]:
+    return w._base if isinstance(w, ExactCqWrapper) else w
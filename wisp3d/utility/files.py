@@ -0,0 +1,21 @@
+import contextlib
+import os
+from uuid import uuid4
+
+
+# Yields a temporary path next to the given one, the file is moved to the given path only when
+# writing succeeds, so readers never see a partially written file
+@contextlib.contextmanager
+def atomic_output(path: str):
+    directory, name = os.path.split(os.path.abspath(path))
+    # Keep the extension: exporters choose the format by it
+    tmp_path = os.path.join(
+        directory, f".{name}.{uuid4().hex}{os.path.splitext(name)[1]}"
+    )
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
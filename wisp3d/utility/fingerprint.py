@@ -0,0 +1,106 @@
+import math
+
+import cadquery as cq
+from attr import define, field
+from OCP.BRepClass3d import BRepClass3d_SolidClassifier
+from OCP.TopAbs import TopAbs_IN, TopAbs_OUT
+
+from .brep import to_shape
+
+
+# Summary of a solid that changes whenever its geometry changes noticeably
+@define
+class Fingerprint:
+    volume: float
+    area: float
+    # xmin, ymin, zmin, xmax, ymax, zmax
+    bbox: list[float]
+    n_faces: int
+    n_edges: int
+    n_vertices: int
+    # Classification of a lattice of points in the bounding box, one char per point:
+    # 'i' - inside, 'o' - outside, 'b' - closer to the boundary than the tolerance
+    samples: str
+
+
+@define
+class FingerprintTolerances:
+    # Relative tolerance for volume & area
+    rel: float = field(default=1e-6)
+    # Absolute tolerance for bounding box coordinates & distance to the boundary
+    # of sample points, mm
+    abs: float = field(default=1e-4)
+
+
+def classify_point(shape: cq.Shape, point: cq.Vector, tolerance: float) -> str:
+    classifier = BRepClass3d_SolidClassifier(shape.wrapped)
+    classifier.Perform(point.toPnt(), tolerance)
+    state = classifier.State()
+    if state == TopAbs_IN:
+        return "i"
+    if state == TopAbs_OUT:
+        return "o"
+    return "b"
+
+
+def fingerprint(
+    obj,
+    samples_per_axis: int = 6,
+    tolerances: FingerprintTolerances = FingerprintTolerances(),
+) -> Fingerprint:
+    shape = to_shape(obj)
+    bb = shape.BoundingBox()
+    bbox = [bb.xmin, bb.ymin, bb.zmin, bb.xmax, bb.ymax, bb.zmax]
+
+    # Points are centers of lattice cells, so they don't lie on bounding box faces
+    def axis_points(lo: float, hi: float) -> list[float]:
+        step = (hi - lo) / samples_per_axis
+        return [lo + step * (i + 0.5) for i in range(samples_per_axis)]
+
+    samples = "".join(
+        classify_point(shape, cq.Vector(x, y, z), tolerances.abs)
+        for x in axis_points(bb.xmin, bb.xmax)
+        for y in axis_points(bb.ymin, bb.ymax)
+        for z in axis_points(bb.zmin, bb.zmax)
+    )
+
+    return Fingerprint(
+        volume=shape.Volume(),
+        area=shape.Area(),
+        bbox=bbox,
+        n_faces=len(shape.Faces()),
+        n_edges=len(shape.Edges()),
+        n_vertices=len(shape.Vertices()),
+        samples=samples,
+    )
+
+
+# Returns descriptions of differences, empty if fingerprints match
+def compare_fingerprints(
+    expected: Fingerprint,
+    actual: Fingerprint,
+    tolerances: FingerprintTolerances = FingerprintTolerances(),
+) -> list[str]:
+    differences = []
+    for name in ["volume", "area"]:
+        e, a = getattr(expected, name), getattr(actual, name)
+        if not math.isclose(e, a, rel_tol=tolerances.rel, abs_tol=tolerances.abs):
+            differences.append(f"{name}: {e!r} != {a!r}")
+    if any(abs(e - a) > tolerances.abs for e, a in zip(expected.bbox, actual.bbox)):
+        differences.append(f"bbox: {expected.bbox!r} != {actual.bbox!r}")
+    for name in ["n_faces", "n_edges", "n_vertices"]:
+        e, a = getattr(expected, name), getattr(actual, name)
+        if e != a:
+            differences.append(f"{name}: {e!r} != {a!r}")
+    # Boundary points match anything, a tolerance-level change can flip them
+    if len(expected.samples) != len(actual.samples):
+        differences.append(
+            f"samples: {len(expected.samples)} != {len(actual.samples)} points"
+        )
+    else:
+        flipped = sum(
+            1 for e, a in zip(expected.samples, actual.samples) if e + a in ("io", "oi")
+        )
+        if flipped:
+            differences.append(f"samples: {flipped} points are on the other side")
+    return differences
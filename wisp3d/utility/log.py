@@ -1,12 +1,145 @@
+import contextlib
+import json
+import logging
+import multiprocessing
+import queue
+import sys
 import threading
-from logging import LoggerAdapter
+from logging import Handler, Logger, LoggerAdapter
+from logging.handlers import QueueHandler, QueueListener
+from typing import Iterator, Optional
 
 thread_local_logging = threading.local()
 
+# Used when no adapter is set for the current thread
+default_log_adapter = LoggerAdapter(logging.getLogger("wisp3d"), {})
 
-def set_threadlocal_log_adapter(adapter: LoggerAdapter):
+
+def set_threadlocal_log_adapter(adapter: Optional[LoggerAdapter]):
     thread_local_logging.logger_adapter = adapter
 
 
+def get_threadlocal_log_adapter() -> Optional[LoggerAdapter]:
+    return getattr(thread_local_logging, "logger_adapter", None)
+
+
 def log() -> LoggerAdapter:
-    return thread_local_logging.logger_adapter
+    return get_threadlocal_log_adapter() or default_log_adapter
+
+
+# Formats a record as a single-line JSON object, structured fields are taken from record attributes
+class JsonFormatter(logging.Formatter):
+    structured_fields = ["build_id", "target"]
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name in self.structured_fields:
+            if hasattr(record, name):
+                data[name] = getattr(record, name)
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data)
+
+
+# Human-readable colored output, messages of a target are indented
+class ColorFormatter(logging.Formatter):
+    blue = "\x1b[1;34m"
+    gray = "\x1b[0;37m"
+    reset = "\x1b[0m"
+
+    def format(self, record: logging.LogRecord) -> str:
+        if getattr(record, "target", None) is not None:
+            color, indent = self.gray, "  "
+        else:
+            color, indent = self.blue, ""
+        return f"{color}{indent}{super().format(record)}{self.reset}"
+
+
+def color_stream_handler(stream=sys.stdout) -> Handler:
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(ColorFormatter())
+    return handler
+
+
+# Single queue-backed handler of a logger shared by all its users.
+# Records are written to the output handler by a background thread.
+# The handler is attached when the first user acquires it and removed when the last one releases it.
+class QueueLogging:
+    def __init__(self, logger_name: str, level: int = logging.DEBUG):
+        self.logger: Logger = logging.getLogger(logger_name)
+        self.level = level
+        output_handler = logging.StreamHandler(sys.stdout)
+        output_handler.setFormatter(JsonFormatter())
+        self.output_handler: Handler = output_handler
+
+        self._lock = threading.Lock()
+        self._users = 0
+        self._queue = queue.SimpleQueue()
+        self._queue_handler: Optional[QueueHandler] = None
+        self._listener: Optional[QueueListener] = None
+
+    def set_output_handler(self, handler: Handler):
+        with self._lock:
+            if self._users != 0:
+                raise RuntimeError("Output handler can't be changed while in use")
+            self.output_handler = handler
+
+    def acquire(self):
+        with self._lock:
+            if self._users == 0:
+                self.logger.setLevel(self.level)
+                self._queue_handler = QueueHandler(self._queue)
+                self.logger.addHandler(self._queue_handler)
+                self._listener = QueueListener(self._queue, self.output_handler)
+                self._listener.start()
+            self._users += 1
+
+    def release(self):
+        with self._lock:
+            self._users -= 1
+            if self._users == 0:
+                self.logger.removeHandler(self._queue_handler)
+                # Stopping a listener writes all queued records
+                self._listener.stop()
+                self._queue_handler = None
+                self._listener = None
+
+
+# Logs records through an adapter, so that they get fields of the adapter's context
+class AdapterHandler(Handler):
+    def __init__(self, adapter: LoggerAdapter):
+        super().__init__()
+        self.adapter = adapter
+
+    def emit(self, record: logging.LogRecord):
+        # QueueHandler has already merged arguments & exception text into the message
+        self.adapter.log(record.levelno, "%s", record.getMessage())
+
+
+def init_worker_logging(records: multiprocessing.Queue):
+    logger = logging.getLogger("wisp3d.worker")
+    logger.handlers = [QueueHandler(records)]
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    set_threadlocal_log_adapter(LoggerAdapter(logger, {}))
+
+
+# Keyword arguments of a process pool whose workers log to log() of the current thread.
+# Records of workers are sent through a queue & logged by a background thread.
+@contextlib.contextmanager
+def worker_logging() -> Iterator[dict]:
+    records = multiprocessing.Queue()
+    listener = QueueListener(records, AdapterHandler(log()))
+    listener.start()
+    try:
+        yield {"initializer": init_worker_logging, "initargs": (records,)}
+    finally:
+        # Workers have exited by now, stopping the listener writes all their records
+        listener.stop()
+        records.close()
+        records.join_thread()
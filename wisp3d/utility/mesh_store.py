@@ -0,0 +1,121 @@
+import hashlib
+import mmap
+import os
+import struct
+from typing import Optional
+
+import numpy as np
+from attr import define
+
+from .brep import to_shape
+from .files import atomic_output
+
+# File layout: header, vertices (float32 x 3 per vertex), triangles (uint32 x 3 per triangle)
+mesh_header = struct.Struct("<8sIIQQ")
+mesh_magic = b"W3DMESH\0"
+mesh_format_version = 1
+
+
+@define
+class Mesh:
+    # (n, 3) float32
+    vertices: np.ndarray
+    # (m, 3) uint32, indices of vertices
+    triangles: np.ndarray
+
+
+def tessellate(obj, tolerance: float, angular_tolerance: float) -> Mesh:
+    vertices, triangles = to_shape(obj).tessellate(tolerance, angular_tolerance)
+    return Mesh(
+        vertices=np.array([v.toTuple() for v in vertices], dtype=np.float32).reshape(
+            -1, 3
+        ),
+        triangles=np.array(triangles, dtype=np.uint32).reshape(-1, 3),
+    )
+
+
+# Tessellated parts stored in flat binary files by a geometry key & tessellation tolerances.
+# Stored meshes are memory-mapped, arrays returned by get are read-only views of the file.
+class MeshStore:
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    @staticmethod
+    def key(geometry_key: str, tolerance: float, angular_tolerance: float) -> str:
+        return hashlib.sha256(
+            f"{geometry_key}:{tolerance!r}:{angular_tolerance!r}".encode()
+        ).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.mesh")
+
+    def get(self, key: str) -> Optional[Mesh]:
+        try:
+            with open(self.path(key), "rb") as f:
+                # The mapping stays valid after the file is closed
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            # ValueError: the file is empty
+            return None
+
+        if len(mm) < mesh_header.size:
+            return None
+        magic, version, _, n_vertices, n_triangles = mesh_header.unpack_from(mm, 0)
+        expected_size = mesh_header.size + (n_vertices + n_triangles) * 3 * 4
+        if (
+            magic != mesh_magic
+            or version != mesh_format_version
+            or len(mm) != expected_size
+        ):
+            return None
+        vertices_offset = mesh_header.size
+        triangles_offset = vertices_offset + n_vertices * 3 * 4
+        return Mesh(
+            vertices=np.frombuffer(
+                mm, dtype=np.float32, count=n_vertices * 3, offset=vertices_offset
+            ).reshape(-1, 3),
+            triangles=np.frombuffer(
+                mm, dtype=np.uint32, count=n_triangles * 3, offset=triangles_offset
+            ).reshape(-1, 3),
+        )
+
+    def put(self, key: str, mesh: Mesh) -> Mesh:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        vertices = np.ascontiguousarray(mesh.vertices, dtype="<f4")
+        triangles = np.ascontiguousarray(mesh.triangles, dtype="<u4")
+        with atomic_output(path) as tmp_path:
+            with open(tmp_path, "wb") as f:
+                f.write(
+                    mesh_header.pack(
+                        mesh_magic,
+                        mesh_format_version,
+                        0,
+                        len(vertices),
+                        len(triangles),
+                    )
+                )
+                f.write(vertices.tobytes())
+                f.write(triangles.tobytes())
+        return self.get(key)
+
+
+stl_triangle_dtype = np.dtype(
+    [("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attributes", "<u2")]
+)
+
+
+def write_binary_stl(mesh: Mesh, path: str):
+    corners = mesh.vertices[mesh.triangles]
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+
+    records = np.zeros(len(corners), dtype=stl_triangle_dtype)
+    records["normal"] = normals
+    records["vertices"] = corners
+    with atomic_output(path) as tmp_path:
+        with open(tmp_path, "wb") as f:
+            f.write(b"wisp3d".ljust(80, b"\0"))
+            f.write(struct.pack("<I", len(records)))
+            f.write(records.tobytes())
@@ -0,0 +1,102 @@
+from typing import List
+
+import cadquery as cq
+from attr import define, field
+
+from .exact_cq import to_exact_single, ExactNum
+from .shape import Rect
+
+
+# Exact rational vertical slot: a rectangle with semicircles on top & bottom
+@define(frozen=True)
+class Slot:
+    center_x: ExactNum = field(converter=to_exact_single)
+    center_y: ExactNum = field(converter=to_exact_single)
+    width: ExactNum = field(converter=to_exact_single)
+    height: ExactNum = field(converter=to_exact_single)
+
+    @property
+    def bounding_rect(self) -> Rect:
+        return Rect(
+            self.center_x - self.width / 2,
+            self.center_y - self.height / 2,
+            self.width,
+            self.height,
+        )
+
+    # Local 2D coordinates are mapped to the plane
+    def make_wire(self, plane: cq.Plane) -> cq.Wire:
+        r = float(self.width / 2)
+        cx, cy = float(self.center_x), float(self.center_y)
+        if self.height == self.width:
+            return cq.Wire.makeCircle(r, plane.toWorldCoords((cx, cy)), plane.zDir)
+
+        half_line = float((self.height - self.width) / 2)
+
+        def pt(x: float, y: float) -> cq.Vector:
+            return plane.toWorldCoords((x, y))
+
+        return cq.Wire.assembleEdges(
+            [
+                cq.Edge.makeLine(
+                    pt(cx + r, cy - half_line), pt(cx + r, cy + half_line)
+                ),
+                cq.Edge.makeThreePointArc(
+                    pt(cx + r, cy + half_line),
+                    pt(cx, cy + half_line + r),
+                    pt(cx - r, cy + half_line),
+                ),
+                cq.Edge.makeLine(
+                    pt(cx - r, cy + half_line), pt(cx - r, cy - half_line)
+                ),
+                cq.Edge.makeThreePointArc(
+                    pt(cx - r, cy - half_line),
+                    pt(cx, cy - half_line - r),
+                    pt(cx + r, cy - half_line),
+                ),
+            ]
+        )
+
+
+# Rectangle with slot-shaped holes, computed exactly & passed to OCC as a single face
+# with inner wires, so no 2D boolean operations are needed
+@define
+class PlanarProfile:
+    outer: Rect
+    slots: List[Slot] = field(factory=list)
+
+    # Raises ValueError if a slot is not strictly inside the outer rectangle
+    # or slots overlap. Slots are compared by bounding rectangles,
+    # that is enough for slots of a lattice.
+    def validate(self):
+        rects = sorted((s.bounding_rect for s in self.slots), key=lambda r: r.min_x)
+        active: List[Rect] = []
+        for rect in rects:
+            if not (
+                self.outer.min_x < rect.min_x
+                and rect.max_x < self.outer.max_x
+                and self.outer.min_y < rect.min_y
+                and rect.max_y < self.outer.max_y
+            ):
+                raise ValueError(f"Slot {rect} is not inside {self.outer}")
+            # Sweep by X: only rectangles that are not entirely to the left can overlap
+            active = [a for a in active if a.max_x > rect.min_x]
+            for a in active:
+                if a.min_y < rect.max_y and rect.min_y < a.max_y:
+                    raise ValueError(f"Slots {a} and {rect} overlap")
+            active.append(rect)
+
+    def make_face(self, plane: cq.Plane) -> cq.Face:
+        corners = [
+            (self.outer.min_x, self.outer.min_y),
+            (self.outer.max_x, self.outer.min_y),
+            (self.outer.max_x, self.outer.max_y),
+            (self.outer.min_x, self.outer.max_y),
+            (self.outer.min_x, self.outer.min_y),
+        ]
+        outer_wire = cq.Wire.makePolygon(
+            [plane.toWorldCoords((float(x), float(y))) for x, y in corners]
+        )
+        return cq.Face.makeFromWires(
+            outer_wire, [s.make_wire(plane) for s in self.slots]
+        )
@@ -0,0 +1,178 @@
+import contextlib
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from typing import Optional
+
+from cadquery.occ_impl.exporters.svg import getSVG
+
+from .brep import shape_to_brep, shape_from_brep
+from .exact_cq import unwrap_cq_object
+from .files import atomic_output
+from .log import worker_logging
+
+default_svg_options = {
+    "width": 300,
+    "height": 300,
+    "marginLeft": 10,
+    "marginTop": 10,
+    "showAxes": False,
+    "projectionDir": (-1.75, 1.1, 5),
+    "showHidden": False,
+}
+
+
+# Run in worker processes
+def render_svg(brep: bytes, options: dict) -> str:
+    return getSVG(shape_from_brep(brep), options)
+
+
+def render_svgs(breps: list[bytes], options: dict) -> list[str]:
+    return [render_svg(brep, options) for brep in breps]
+
+
+# make_breps(*args) returns the BREP of one part or a sequence of BREPs
+def make_and_render_svgs(make_breps, args: tuple, options: dict) -> list[str]:
+    breps = make_breps(*args)
+    if isinstance(breps, bytes):
+        breps = [breps]
+    return render_svgs(breps, options)
+
+
+# Rendered SVGs stored by a hash of the shape (its BREP or a geometry key)
+# & render options
+class SvgCache:
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    @staticmethod
+    def key(geometry: bytes, options: dict) -> str:
+        h = hashlib.sha256(geometry)
+        h.update(json.dumps(options, sort_keys=True).encode())
+        return h.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.svg")
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with open(self.path(key), "rt") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, svg: str):
+        os.makedirs(self.directory, exist_ok=True)
+        with atomic_output(self.path(key)) as tmp_path:
+            with open(tmp_path, "wt") as f:
+                f.write(svg)
+
+
+def preview_file_name(part_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", part_name) + ".svg"
+
+
+# Renders parts to <directory>/<part name>.svg as they are added.
+# Cached SVGs are written at once, missing parts are projected in a process pool
+# that is started on the first miss. Their SVGs are written as soon as they are
+# rendered & then released: finished renders are collected on every add and the
+# rest as they complete when the exporter is closed.
+class PreviewExporter:
+    def __init__(
+        self,
+        directory: str,
+        cache: SvgCache,
+        options: Optional[dict] = None,
+        max_workers: Optional[int] = None,
+    ):
+        self.directory = directory
+        self.cache = cache
+        self.options = options or default_svg_options
+        self.max_workers = max_workers
+        # Part name -> path of the written SVG
+        self.paths: dict[str, str] = {}
+        self._stack = contextlib.ExitStack()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Future -> names & cache keys of the parts it renders
+        self._pending: dict[Future, list[tuple[str, str]]] = {}
+
+    def __enter__(self) -> "PreviewExporter":
+        os.makedirs(self.directory, exist_ok=True)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        with self._stack:
+            if exc_type is None:
+                for future in as_completed(list(self._pending)):
+                    self._write_rendered(self._pending.pop(future), future.result())
+        self._pending.clear()
+
+    # Part that is already made, cached by its BREP
+    def add(self, name: str, part):
+        self._write_finished()
+        brep = shape_to_brep(part)
+        parts = [(name, SvgCache.key(brep, self.options))]
+        if not self._write_cached(parts):
+            self._submit(parts, render_svgs, [brep], self.options)
+
+    # Parts that are made together by make_breps(*args) in a worker process,
+    # cached by their geometry keys: nothing is made if all of them are cached
+    def add_made(
+        self, names: list[str], geometry_keys: list[str], make_breps, *args
+    ) -> bool:
+        self._write_finished()
+        parts = [
+            (name, SvgCache.key(k.encode(), self.options))
+            for name, k in zip(names, geometry_keys)
+        ]
+        if self._write_cached(parts):
+            return False
+        self._submit(parts, make_and_render_svgs, make_breps, args, self.options)
+        return True
+
+    def _write_cached(self, parts: list[tuple[str, str]]) -> bool:
+        svgs = [self.cache.get(key) for _, key in parts]
+        if any(svg is None for svg in svgs):
+            return False
+        for (name, _), svg in zip(parts, svgs):
+            self._write(name, svg)
+        return True
+
+    def _write_rendered(self, parts: list[tuple[str, str]], svgs: list[str]):
+        for (name, key), svg in zip(parts, svgs):
+            self.cache.put(key, svg)
+            self._write(name, svg)
+
+    def _write_finished(self):
+        for future in [f for f in self._pending if f.done()]:
+            self._write_rendered(self._pending.pop(future), future.result())
+
+    def _submit(self, parts: list[tuple[str, str]], fn, *args):
+        if self._executor is None:
+            pool_logging = self._stack.enter_context(worker_logging())
+            self._executor = self._stack.enter_context(
+                ProcessPoolExecutor(max_workers=self.max_workers, **pool_logging)
+            )
+        self._pending[self._executor.submit(fn, *args)] = parts
+
+    def _write(self, name: str, svg: str):
+        self.paths[name] = os.path.join(self.directory, preview_file_name(name))
+        with atomic_output(self.paths[name]) as tmp_path:
+            with open(tmp_path, "wt") as f:
+                f.write(svg)
+
+
+# Renders every child of an assembly to <directory>/<child name>.svg
+def export_assembly_previews(
+    asm,
+    directory: str,
+    cache: SvgCache,
+    options: Optional[dict] = None,
+    max_workers: Optional[int] = None,
+) -> dict[str, str]:
+    with PreviewExporter(directory, cache, options, max_workers) as exporter:
+        for child in unwrap_cq_object(asm).children:
+            exporter.add(child.name, child.toCompound())
+    return exporter.paths
@@ -22,20 +22,22 @@ class Vec2:
 cattr.register_structure_hook(Vec2, lambda data, cl: Vec2.deserialize(data))
 
 
-# Exact rational axis-aligned 2D rectangle
-@define
+# Exact rational axis-aligned 2D rectangle, immutable so that max_x & max_y are computed only once
+@define(frozen=True)
 class Rect:
     min_x: ExactNum = field(converter=to_exact_single)
     min_y: ExactNum = field(converter=to_exact_single)
     width: ExactNum = field(converter=to_exact_single)
     height: ExactNum = field(converter=to_exact_single)
+    max_x: ExactNum = field(init=False)
+    max_y: ExactNum = field(init=False)
 
-    @property
-    def max_x(self):
+    @max_x.default
+    def _max_x(self):
         return self.min_x + self.width
 
-    @property
-    def max_y(self):
+    @max_y.default
+    def _max_y(self):
         return self.min_y + self.height
 
     def expand_x(self, new_x) -> "Rect":
@@ -0,0 +1,93 @@
+import argparse
+import logging
+import os
+import time
+from typing import Optional
+
+from attr import define, field
+
+from wisp3d.script import Build, Script, ScriptInput, default_registry
+from wisp3d.script.build import build_log
+from wisp3d.utility import color_stream_handler
+
+watch_log = logging.getLogger("watch")
+
+
+# Rebuilds the script output every time the config file changes.
+# The previous build is kept, targets whose inputs didn't change reuse its artifacts.
+@define
+class Watcher:
+    path: str
+    script: Script
+    interval: float = 0.5
+    previous_input: Optional[ScriptInput] = field(default=None)
+    previous_build: Optional[Build] = field(default=None)
+    _last_stat: Optional[tuple] = field(default=None)
+
+    # Changes are detected by polling, modification time & size are compared
+    def poll(self) -> bool:
+        try:
+            st = os.stat(self.path)
+            stat = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            stat = None
+        if stat == self._last_stat:
+            return False
+        self._last_stat = stat
+        return stat is not None
+
+    def rebuild(self):
+        try:
+            script_input = ScriptInput.from_file(self.path)
+            build = self.script.create_build(script_input)
+        except Exception as e:
+            # The file may be invalid or partially written, the next change triggers a new attempt
+            watch_log.error("Can't read %s: %s", self.path, e)
+            return
+
+        if self.previous_build is not None:
+            changed_keys = script_input.changed_keys(self.previous_input)
+            if not changed_keys:
+                watch_log.info("Nothing changed")
+                return
+            reused = build.reuse_artifacts(self.previous_build, changed_keys)
+            watch_log.info(
+                "Changed: %s, reused: %s",
+                ", ".join(sorted(changed_keys)),
+                ", ".join(t.name for t in reused) or "nothing",
+            )
+
+        try:
+            build.resolve_all()
+        except Exception:
+            # Keep the previous build, its artifacts are still valid for the previous input
+            watch_log.exception("Build failed")
+            return
+
+        self.previous_input = script_input
+        self.previous_build = build
+
+    def run(self):
+        watch_log.info("Watching %s", self.path)
+        while True:
+            if self.poll():
+                self.rebuild()
+            time.sleep(self.interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild on every config change")
+    parser.add_argument("config", nargs="?", default="config.yml")
+    parser.add_argument("--interval", type=float, default=0.5)
+    parser.add_argument("--script", default="pegboard")
+    args = parser.parse_args()
+
+    build_log.set_output_handler(color_stream_handler())
+    watch_log.setLevel(logging.INFO)
+    watch_log.addHandler(color_stream_handler())
+
+    try:
+        script = default_registry().create(args.script)
+        Watcher(args.config, script, interval=args.interval).run()
+    except KeyboardInterrupt:
+        pass